@@ -0,0 +1,3524 @@
+"""Claudio audit engine: crawling, Ahrefs, LLM and document generation without any UI.
+
+Used by the Streamlit app (app.py), the batch CLI (cli.py) and directly as a Python API:
+
+    import audit_engine as engine
+    engine.configure_from_env()
+    result = engine.run_audit("example.com", "Basic")
+    engine.write_audit_outputs(result, "audits/")
+"""
+from __future__ import annotations
+
+import os
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from io import BytesIO
+import re
+import json
+from pathlib import Path
+from urllib.parse import urlparse, urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape as xml_escape
+import threading
+import queue
+import random
+import zlib
+import sqlite3
+import hashlib
+import heapq
+import bisect
+import itertools
+import copy
+import math
+import importlib.util
+from functools import lru_cache
+from array import array
+from requests.structures import CaseInsensitiveDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from docx.document import Document
+
+
+# ===========================
+# 📦 LAZY IMPORTS
+# Model SDKs, python-docx, openpyxl, lxml and numpy are imported on first use,
+# so importing the engine (and the app's first paint) only pays for what a run
+# actually touches. Model clients are built once per API key.
+# ===========================
+def _sdk_installed(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+GEMINI_SDK_AVAILABLE = _sdk_installed("google.generativeai")
+ANTHROPIC_SDK_AVAILABLE = _sdk_installed("anthropic")  # optional Claude support (only used if selected + key present)
+
+@lru_cache(maxsize=None)
+def gemini_model(api_key: str, model_name: str):
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+@lru_cache(maxsize=None)
+def claude_client(api_key: str):
+    import anthropic
+    return anthropic.Anthropic(api_key=api_key)
+
+@lru_cache(maxsize=1)
+def _numpy():
+    """numpy if installed (vectorized PageRank), else None for the pure-Python fallback."""
+    try:
+        import numpy
+    except Exception:
+        return None
+    return numpy
+
+
+# ===========================
+# 🔑 API CONFIGURATION
+# Set once per process with configure() (the app passes st.secrets, the CLI
+# uses configure_from_env()).
+# ===========================
+GEMINI_API_KEY = ""
+GEMINI_AVAILABLE = False
+CLAUDE_API_KEY = ""
+CLAUDE_AVAILABLE = False
+AHREFS_API_KEY = ""
+AHREFS_AVAILABLE = False
+AHREFS_OFFLINE = False  # replay mode: serve Ahrefs responses from the local cache only (no network, no credits)
+
+def configure(gemini_api_key: str = "", anthropic_api_key: str = "", ahrefs_api_key: str = "", ahrefs_offline: bool = False):
+    global GEMINI_API_KEY, GEMINI_AVAILABLE, CLAUDE_API_KEY, CLAUDE_AVAILABLE
+    global AHREFS_API_KEY, AHREFS_AVAILABLE, AHREFS_OFFLINE
+
+    GEMINI_API_KEY = gemini_api_key or ""
+    GEMINI_AVAILABLE = bool(GEMINI_API_KEY) and GEMINI_SDK_AVAILABLE
+
+    CLAUDE_API_KEY = anthropic_api_key or ""
+    CLAUDE_AVAILABLE = bool(CLAUDE_API_KEY) and ANTHROPIC_SDK_AVAILABLE
+
+    AHREFS_API_KEY = ahrefs_api_key or ""
+    AHREFS_AVAILABLE = bool(AHREFS_API_KEY)
+    AHREFS_OFFLINE = bool(ahrefs_offline)
+
+def configure_from_env():
+    configure(
+        gemini_api_key=os.environ.get("GOOGLE_API_KEY", ""),
+        anthropic_api_key=os.environ.get("ANTHROPIC_API_KEY", ""),
+        ahrefs_api_key=os.environ.get("AHREFS_API_KEY", ""),
+        ahrefs_offline=os.environ.get("AHREFS_OFFLINE", "").strip().lower() in ("1", "true", "yes"),
+    )
+
+# ===========================
+# 🧠 PATHS (templates + prompts)
+# ===========================
+BASE_DIR = Path(__file__).parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+PROMPTS_DIR = BASE_DIR / "prompts"
+
+DOCX_TEMPLATE_FULL = TEMPLATES_DIR / "SEO_Audit_Template_Full.docx"
+XLSX_TEMPLATE_FULL = TEMPLATES_DIR / "SEO_Tasks_Template_Full.xlsx"
+
+PROMPT_FULL = PROMPTS_DIR / "full.md"
+PROMPT_BASIC = PROMPTS_DIR / "basic.md"
+
+CACHE_DIR = BASE_DIR / ".cache"
+
+
+# ===========================
+# 🔧 UTILS
+# ===========================
+def normalize_domain(url_or_domain: str) -> str:
+    s = (url_or_domain or "").strip()
+    if not s:
+        return ""
+    if s.startswith(("http://", "https://")):
+        s = urlparse(s).netloc
+    s = s.lower()
+    if s.startswith("www."):
+        s = s[4:]
+    s = s.split(":")[0]
+    return s
+
+def load_prompt(path: Path) -> str:
+    if path.exists():
+        return path.read_text(encoding="utf-8")
+    return ""
+
+def strip_json_fences(text: str) -> str:
+    t = (text or "").strip()
+    t = re.sub(r"^```(?:json)?\s*", "", t, flags=re.IGNORECASE)
+    t = re.sub(r"\s*```$", "", t)
+    return t.strip()
+
+def safe_int(x, default=0):
+    try:
+        return int(x)
+    except Exception:
+        return default
+
+def no_progress(pct: int, message: str):
+    pass
+
+def priority_from_count(cnt: int) -> str:
+    cnt = safe_int(cnt, 0)
+    if cnt <= 0:
+        return "LOW"
+    if cnt >= 50:
+        return "HIGH"
+    if cnt >= 10:
+        return "MEDIUM"
+    return "LOW"
+
+
+
+# ===========================
+# 🌐 HTTP SESSION (shared keep-alive pool)
+# Crawler, link checker, homepage snapshot and Ahrefs all go through one
+# requests.Session so repeated calls to an origin reuse TCP/TLS connections.
+# ===========================
+HTTP_POOL_HOSTS = 32  # distinct hosts kept in the pool
+HTTP_POOL_PER_HOST = 16  # keep-alive connections per host (>= max concurrent workers per host)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session() -> requests.Session:
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_PER_HOST)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                # "gzip,deflate" plus ",br" when a brotli decoder is installed
+                s.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+                _http_session = s
+    return _http_session
+
+
+# ===========================
+# 💾 DISK CACHE (SQLite, compressed, TTL + size-bounded LRU)
+# ===========================
+class DiskCache:
+    """Key -> (JSON meta, zlib-compressed body) store. Failures degrade to cache misses."""
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._size = 0  # running byte total of all entries, so writes don't sum the table
+
+    def _db(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, meta TEXT, body BLOB, size INTEGER, stored_at REAL, accessed_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)")
+            self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str):
+        """Return (meta, body, stored_at) or None."""
+        try:
+            with self._lock:
+                conn = self._db()
+                row = conn.execute("SELECT meta, body, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+            return json.loads(row[0]), (zlib.decompress(row[1]) if row[1] else b""), row[2]
+        except (sqlite3.Error, zlib.error, ValueError):
+            return None
+
+    def set(self, key: str, meta: dict, body: bytes = b""):
+        blob = zlib.compress(body, 6) if body else b""
+        size = len(blob) + len(key)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._db()
+                old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, meta, body, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, json.dumps(meta, ensure_ascii=False), blob, size, now, now),
+                )
+                self._size += size - (old[0] if old else 0)
+                if self._size > self.max_bytes:
+                    self._evict(conn)
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def touch(self, key: str):
+        """Mark an entry fresh again (e.g. after a 304 revalidation)."""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._db()
+                conn.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn):
+        # resync first: another process sharing the file may have written or evicted
+        self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if self._size <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._size -= size
+            if self._size <= self.max_bytes:
+                break
+
+
+# ===========================
+# 🗄️ HTTP RESPONSE CACHE (under fetch_url)
+# Fresh entries are served from disk; stale ones are revalidated with
+# If-None-Match / If-Modified-Since and a 304 reuses the stored body.
+# Freshness follows the response's Cache-Control / Expires, capped at
+# HTTP_CACHE_TTL. Streamed requests (sitemaps) bypass the cache entirely.
+# ===========================
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_TTL = 6 * 3600  # max seconds an entry is served without revalidation
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+HTTP_CACHE_MAX_BODY_BYTES = 20 * 1024 * 1024  # larger bodies are never stored
+_HTTP_CACHE_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+
+http_cache = DiskCache(CACHE_DIR / "http.sqlite", HTTP_CACHE_MAX_BYTES)
+
+def _response_from_cache(meta: dict, body: bytes):
+    r = requests.Response()
+    r.status_code = meta.get("status", 200)
+    r.reason = "OK"
+    r.url = meta.get("url", "")
+    r.headers = CaseInsensitiveDict(meta.get("headers") or {})
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    r._content = body
+    r._content_consumed = True  # iter_content() then slices the stored body instead of reading r.raw
+    for status, url in meta.get("history") or []:
+        hop = requests.Response()
+        hop.status_code = status
+        hop.url = url
+        r.history.append(hop)
+    return r
+
+def _cache_directives(headers) -> dict:
+    directives = {}
+    for part in (headers.get("Cache-Control") or "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip().strip('"')
+    return directives
+
+def _freshness_lifetime(headers) -> float:
+    """Seconds a response may be served from disk without revalidation (0 = always revalidate)."""
+    directives = _cache_directives(headers)
+    if "no-cache" in directives or (not directives and "no-cache" in (headers.get("Pragma") or "").lower()):
+        return 0
+    if "max-age" in directives:
+        return min(max(safe_int(directives["max-age"], 0), 0), HTTP_CACHE_TTL)
+    if headers.get("Expires"):
+        try:
+            expires = parsedate_to_datetime(headers["Expires"])
+            date = parsedate_to_datetime(headers["Date"]) if headers.get("Date") else datetime.now(expires.tzinfo)
+            return min(max((expires - date).total_seconds(), 0), HTTP_CACHE_TTL)
+        except (TypeError, ValueError):
+            return 0  # an invalid Expires means already expired
+    return HTTP_CACHE_TTL
+
+def _store_response(key: str, r):
+    if r.status_code != 200 or "no-store" in _cache_directives(r.headers) or len(r.content) > HTTP_CACHE_MAX_BODY_BYTES:
+        return
+    meta = {
+        "status": r.status_code,
+        "url": r.url,
+        "headers": {k: v for k, v in r.headers.items() if k.lower() not in _HTTP_CACHE_DROP_HEADERS},
+        "etag": r.headers.get("ETag", ""),
+        "last_modified": r.headers.get("Last-Modified", ""),
+        "max_age": _freshness_lifetime(r.headers),
+        "history": [[h.status_code, h.url] for h in r.history],
+    }
+    http_cache.set(key, meta, r.content)
+
+def http_get(url: str, headers: dict, timeout: int, stream: bool = False):
+    """GET through the shared session + disk cache. Network errors propagate.
+    stream=True skips the cache so the body is never buffered whole."""
+    session = get_http_session()
+    if stream or not HTTP_CACHE_ENABLED:
+        return session.get(url, headers=headers, timeout=timeout, allow_redirects=True, stream=stream)
+
+    key = "GET " + url
+    hit = http_cache.get(key)
+    req_headers = dict(headers or {})
+    if hit:
+        meta, body, stored_at = hit
+        if time.time() - stored_at < meta.get("max_age", HTTP_CACHE_TTL):
+            return _response_from_cache(meta, body)
+        if meta.get("etag"):
+            req_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            req_headers["If-Modified-Since"] = meta["last_modified"]
+
+    r = session.get(url, headers=req_headers, timeout=timeout, allow_redirects=True)
+    if hit and r.status_code == 304:
+        meta = hit[0]
+        if r.headers.get("Cache-Control") or r.headers.get("Expires"):
+            meta = dict(meta, max_age=_freshness_lifetime(r.headers))  # a 304 may carry new freshness info
+            http_cache.set(key, meta, hit[1])
+        else:
+            http_cache.touch(key)
+        return _response_from_cache(meta, hit[1])
+    _store_response(key, r)
+    return r
+
+
+# ===========================
+# 🔗 AHREFS CLIENT (cache + in-flight coalescing)
+# Responses are cached per endpoint + normalized params so re-running an audit
+# for the same domain does not spend API credits again.
+# ===========================
+AHREFS_CACHE_ENABLED = True
+AHREFS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+AHREFS_CACHE_DEFAULT_TTL = 24 * 3600
+AHREFS_CACHE_TTL = {
+    "site-explorer/metrics": 24 * 3600,
+    "site-explorer/organic-keywords": 7 * 24 * 3600,
+    "site-explorer/refdomains": 24 * 3600,
+    "site-explorer/all-backlinks": 24 * 3600,
+    "site-explorer/organic-competitors": 7 * 24 * 3600,
+    "site-audit/projects": 3600,
+    "site-audit/issues": 24 * 3600,
+    "site-audit/page-explorer": 24 * 3600,
+}
+AHREFS_CACHE_KEY_IGNORE = {"date"}  # freshness is handled by the TTL instead
+AHREFS_RATE_PER_SEC = 2.0  # starting request rate; adapts between MIN and MAX
+AHREFS_RATE_MIN = 0.2
+AHREFS_RATE_MAX = 5.0
+AHREFS_BURST = 5  # lets the five Site Explorer calls go out together
+AHREFS_MAX_RETRIES = 4
+AHREFS_BACKOFF_BASE = 0.5  # seconds, doubled per retry with jitter
+
+class AdaptiveTokenBucket:
+    """Token bucket whose rate halves on 429/exhausted quota and creeps back up on success (AIMD)."""
+
+    def __init__(self, rate: float, burst: int, min_rate: float, max_rate: float):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(min(max(wait, 0.01), 5.0))
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def on_throttle(self, retry_after: float = None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def on_headers(self, headers):
+        """Pause until the window resets when the server says the quota is used up."""
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is None or safe_int(remaining, 1) > 0:
+            return
+        reset = float(safe_int(headers.get("X-RateLimit-Reset"), 1))
+        if reset > 1e9:  # epoch seconds
+            reset -= time.time()
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + min(max(reset, 0.0), 60.0))
+
+ahrefs_cache = DiskCache(CACHE_DIR / "ahrefs.sqlite", AHREFS_CACHE_MAX_BYTES)
+ahrefs_limiter = AdaptiveTokenBucket(AHREFS_RATE_PER_SEC, AHREFS_BURST, AHREFS_RATE_MIN, AHREFS_RATE_MAX)
+_ahrefs_inflight = {}
+_ahrefs_inflight_lock = threading.Lock()
+
+def ahrefs_headers():
+    return {
+        "Authorization": f"Bearer {AHREFS_API_KEY}",
+        "Accept": "application/json"
+    }
+
+def ahrefs_cache_key(url: str, params: dict):
+    endpoint = urlparse(url).path.split("/v3/", 1)[-1].strip("/")
+    norm = {}
+    for k, v in (params or {}).items():
+        if k in AHREFS_CACHE_KEY_IGNORE or v is None or v == "":
+            continue
+        v = str(v).strip()
+        norm[str(k)] = v.lower() if k == "target" else v
+    return endpoint, endpoint + "?" + json.dumps(norm, sort_keys=True)
+
+def _retry_after_seconds(r):
+    v = r.headers.get("Retry-After") if r is not None else None
+    try:
+        return min(max(float(v), 0.0), 60.0) if v is not None else None
+    except ValueError:
+        return None
+
+def _ahrefs_request(url: str, params: dict, timeout: int):
+    r = None
+    for attempt in range(AHREFS_MAX_RETRIES + 1):
+        ahrefs_limiter.acquire()
+        try:
+            r = get_http_session().get(url, headers=ahrefs_headers(), params=params, timeout=timeout)
+        except Exception:
+            r = None
+        if r is not None:
+            ahrefs_limiter.on_headers(r.headers)
+            if r.status_code == 429:
+                ahrefs_limiter.on_throttle(_retry_after_seconds(r))
+            elif r.status_code < 500:
+                break
+        if attempt < AHREFS_MAX_RETRIES:
+            delay = _retry_after_seconds(r) or AHREFS_BACKOFF_BASE * (2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+
+    if r is None:
+        return None, None
+    if r.status_code != 200:
+        return r.status_code, None
+    ahrefs_limiter.on_success()
+    try:
+        return r.status_code, r.json()
+    except Exception:
+        return r.status_code, None
+
+def ahrefs_get(url: str, params: dict, timeout: int = 30):
+    endpoint, key = ahrefs_cache_key(url, params)
+
+    if AHREFS_CACHE_ENABLED or AHREFS_OFFLINE:
+        hit = ahrefs_cache.get(key)
+        ttl = AHREFS_CACHE_TTL.get(endpoint, AHREFS_CACHE_DEFAULT_TTL)
+        if hit and (AHREFS_OFFLINE or time.time() - hit[2] < ttl):
+            try:
+                return 200, json.loads(hit[1])
+            except ValueError:
+                pass
+        if AHREFS_OFFLINE:
+            return None, None
+
+    # Coalesce: concurrent callers asking for the same key wait for a single request
+    with _ahrefs_inflight_lock:
+        waiter = _ahrefs_inflight.get(key)
+        leader = waiter is None
+        if leader:
+            waiter = _ahrefs_inflight[key] = {"done": threading.Event(), "result": (None, None)}
+    if not leader:
+        waiter["done"].wait()
+        return waiter["result"]
+
+    try:
+        code, data = _ahrefs_request(url, params, timeout)
+        waiter["result"] = (code, data)
+        if AHREFS_CACHE_ENABLED and code == 200 and data is not None:
+            ahrefs_cache.set(key, {"endpoint": endpoint, "status": code}, json.dumps(data).encode("utf-8"))
+        return code, data
+    finally:
+        with _ahrefs_inflight_lock:
+            _ahrefs_inflight.pop(key, None)
+        waiter["done"].set()
+
+
+# ===========================
+# 🧬 HTML SIGNALS (single streaming pass)
+# lxml feeds parser events straight into a collector: no DOM is built and
+# every signal (title/meta/canonical/robots/headings/images/hreflang/JSON-LD/
+# links/word count) is gathered in one walk over the document.
+# ===========================
+TEXT_SKIP_TAGS = {"script", "style", "template"}  # same tags BeautifulSoup.get_text() ignores
+MAX_H2_TAGS = 5
+SIMHASH_SHINGLE = 3  # words per shingle fed into the page fingerprint
+SIMHASH_MIN_WORDS = 50  # pages with less text get no fingerprint
+WORD_RE = re.compile(r"\w+")
+
+class _HtmlSignalCollector:
+    """lxml parser target (SAX-style callbacks)."""
+
+    def __init__(self):
+        self.title = None
+        self.meta_description = None
+        self.canonical = None
+        self.robots_meta = None
+        self.h1_tags = []
+        self.h2_tags = []
+        self.images_total = 0
+        self.images_missing_alt = 0
+        self.images_without_alt_attr = 0
+        self.hreflang_count = 0
+        self.jsonld_count = 0
+        self.hrefs = []
+        self.word_count = 0
+        self.simhash = None
+        self._bit_counts = [0] * 64  # per-bit tallies of the shingle hashes seen so far
+        self._shingle_count = 0
+        self._tail = []
+        self._skip_depth = 0
+        self._in_title = False
+        self._title_parts = []
+        self._heading = None
+        self._heading_parts = []
+        self._pending = []
+
+    def _flush_text(self):
+        if self._pending:
+            text = "".join(self._pending)
+            self.word_count += len(text.split())
+            self._pending = []
+            # shingles run across element boundaries, so keep the last words of the previous chunk
+            words = self._tail + WORD_RE.findall(text.lower())
+            hashes = [
+                int.from_bytes(hashlib.blake2b(" ".join(words[i:i + SIMHASH_SHINGLE]).encode("utf-8"),
+                                               digest_size=8).digest(), "big")
+                for i in range(len(words) - SIMHASH_SHINGLE + 1)
+            ]
+            if hashes:
+                tally_simhash_bits(self._bit_counts, hashes)
+                self._shingle_count += len(hashes)
+            self._tail = words[-(SIMHASH_SHINGLE - 1):]
+
+    def start(self, tag, attrib):
+        self._flush_text()
+        if not isinstance(tag, str):
+            return
+        if tag in TEXT_SKIP_TAGS:
+            self._skip_depth += 1
+            if tag == "script" and (attrib.get("type") or "").strip().lower() == "application/ld+json":
+                self.jsonld_count += 1
+        elif tag == "title":
+            self._in_title = self.title is None
+        elif tag in ("h1", "h2") and self._heading is None:
+            self._heading = tag
+            self._heading_parts = []
+        elif tag == "meta":
+            name = (attrib.get("name") or "").strip().lower()
+            if name == "description" and self.meta_description is None:
+                self.meta_description = attrib.get("content") or ""
+            elif name == "robots" and self.robots_meta is None:
+                self.robots_meta = attrib.get("content") or ""
+        elif tag == "link":
+            rel = (attrib.get("rel") or "").lower()
+            if "canonical" in rel and self.canonical is None:
+                self.canonical = attrib.get("href") or ""
+            if "alternate" in rel and "hreflang" in attrib:
+                self.hreflang_count += 1
+        elif tag == "img":
+            self.images_total += 1
+            alt = attrib.get("alt")
+            if not alt:
+                self.images_without_alt_attr += 1
+            if not (alt or "").strip():
+                self.images_missing_alt += 1
+        elif tag == "a":
+            href = attrib.get("href")
+            if href is not None:
+                self.hrefs.append(href.strip())
+
+    def end(self, tag):
+        if not isinstance(tag, str):
+            return
+        if tag in TEXT_SKIP_TAGS:
+            self._pending = []
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        self._flush_text()
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = "".join(self._title_parts)
+        elif tag == self._heading:
+            text = " ".join(" ".join(self._heading_parts).split())
+            if tag == "h1":
+                self.h1_tags.append(text)
+            elif len(self.h2_tags) < MAX_H2_TAGS:
+                self.h2_tags.append(text)
+            self._heading = None
+
+    def data(self, data):
+        if self._skip_depth:
+            return
+        if self._in_title:
+            self._title_parts.append(data)
+        if self._heading:
+            self._heading_parts.append(data)
+        self._pending.append(data)
+
+    def close(self):
+        self._flush_text()
+        if self.simhash is None and self.word_count >= SIMHASH_MIN_WORDS and self._shingle_count:
+            n = self._shingle_count
+            self.simhash = sum(1 << (63 - i) for i, c in enumerate(self._bit_counts) if c * 2 > n)
+        return self
+
+def tally_simhash_bits(counts: list, features: list):
+    """Add the set bits of a batch of 64-bit feature hashes to 64 running per-bit counters.
+
+    The batch is tallied on one bit-string (bit i of every feature sits at the same stride),
+    so the work stays in C instead of a 64 x n Python loop. Only the counters outlive the batch.
+    """
+    bits = "".join(format(h, "064b") for h in features)
+    for i in range(64):
+        counts[i] += bits[i::64].count("1")
+
+def parse_html_signals(content: bytes, encoding: str = None) -> _HtmlSignalCollector:
+    collector = _HtmlSignalCollector()
+    if not content:
+        return collector
+    from lxml import etree
+
+    parser = etree.HTMLParser(target=collector, encoding=encoding)
+    try:
+        parser.feed(content)
+        parser.close()
+    except etree.LxmlError:
+        collector.close()
+    return collector
+
+def response_html_encoding(r):
+    """Charset declared in the Content-Type header, else None (lxml then sniffs <meta charset>)."""
+    return r.encoding if "charset=" in (r.headers.get("Content-Type") or "").lower() else None
+
+
+# ===========================
+# 🔍 WEB ANALYSIS (single page snapshot)
+# ===========================
+def analyze_basic_site(url):
+    """Analyzes the website extracting basic information from HTML (single page)."""
+    try:
+        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+        response = http_get(url, headers=headers, timeout=10)
+        sig = parse_html_signals(response.content, response_html_encoding(response))
+
+        base_domain = normalize_domain(url)
+
+        analysis = {
+            'url': url,
+            'status_code': response.status_code,
+            'title': (sig.title or '').strip() or 'No title found',
+            'meta_description': sig.meta_description or '',
+            'h1_tags': sig.h1_tags,
+            'h2_tags': sig.h2_tags,
+            'images_without_alt': sig.images_without_alt_attr,
+            'total_images': sig.images_total,
+            'internal_links': 0,
+            'external_links': 0,
+            'word_count': sig.word_count
+        }
+
+        for href in sig.hrefs:
+            if href.startswith(('mailto:', 'tel:', '#', 'javascript:')):
+                continue
+            if href.startswith('http'):
+                if normalize_domain(href) != base_domain:
+                    analysis['external_links'] += 1
+                else:
+                    analysis['internal_links'] += 1
+            else:
+                analysis['internal_links'] += 1
+
+        return analysis
+
+    except Exception as e:
+        return {'error': str(e)}
+
+
+# ===========================
+# 🕸️ INTERNAL LINK GRAPH
+# URLs are interned to integer ids and edges live in flat arrays; adjacency is
+# built once as CSR (offsets + targets), so no per-edge Python objects are kept.
+# ===========================
+PAGERANK_DAMPING = 0.85
+PAGERANK_MAX_ITER = 100
+PAGERANK_TOL = 1e-8  # L1 change between iterations that counts as converged
+LINK_GRAPH_EXAMPLES = 10
+
+class LinkGraph:
+    def __init__(self):
+        self.ids = {}
+        self.urls = []
+        self.src = array("I")
+        self.dst = array("I")
+        self._csr = None
+
+    @staticmethod
+    def key(url: str) -> str:
+        # canonical form, so "https://Host", "https://host/" and "https://host/?utm_source=x" are one page
+        return canonicalize_url(url) or url
+
+    def lookup(self, url: str):
+        i = self.ids.get(url)  # canonical links (and seen aliases) skip re-canonicalising
+        return i if i is not None else self.ids.get(self.key(url))
+
+    def node(self, url: str) -> int:
+        i = self.ids.get(url)
+        if i is None:
+            key = self.key(url)
+            i = self.ids.get(key)
+            if i is None:
+                i = self.ids[key] = len(self.urls)
+                self.urls.append(key)
+            self.ids[url] = i
+        return i
+
+    def add_page(self, url: str, final_url: str, links) -> int:
+        """Add a crawled page and its (deduplicated) outlinks; a redirect target shares the page's node."""
+        i = self.node(url)
+        if final_url:
+            self.ids.setdefault(self.key(final_url), i)
+        targets = {self.node(ln) for ln in links}
+        targets.discard(i)
+        self.src.extend([i] * len(targets))
+        self.dst.extend(sorted(targets))
+        self._csr = None
+        return i
+
+    @property
+    def node_count(self) -> int:
+        return len(self.urls)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.dst)
+
+    def csr(self):
+        """(offsets, targets): outlinks of node i are targets[offsets[i]:offsets[i + 1]]."""
+        if self._csr is None:
+            n = self.node_count
+            offsets = array("I", [0]) * (n + 1)
+            for s in self.src:
+                offsets[s + 1] += 1
+            for i in range(n):
+                offsets[i + 1] += offsets[i]
+            fill = array("I", offsets)
+            targets = array("I", [0]) * len(self.dst)
+            for s, d in zip(self.src, self.dst):
+                targets[fill[s]] = d
+                fill[s] += 1
+            self._csr = (offsets, targets)
+        return self._csr
+
+    def inlinks(self) -> array:
+        counts = array("I", [0]) * self.node_count
+        for d in self.dst:
+            counts[d] += 1
+        return counts
+
+    def click_depths(self, start_url: str) -> list:
+        """BFS depth from start_url for every node (None when unreachable)."""
+        depth = [None] * self.node_count
+        start = self.lookup(start_url)
+        if start is None:
+            return depth
+        offsets, targets = self.csr()
+        depth[start] = 0
+        frontier = [start]
+        level = 0
+        while frontier:
+            level += 1
+            nxt = []
+            for u in frontier:
+                for v in targets[offsets[u]:offsets[u + 1]]:
+                    if depth[v] is None:
+                        depth[v] = level
+                        nxt.append(v)
+            frontier = nxt
+        return depth
+
+    def pagerank(self, damping: float = PAGERANK_DAMPING, max_iter: int = PAGERANK_MAX_ITER,
+                 tol: float = PAGERANK_TOL) -> list:
+        """Power iteration; rank from pages without outlinks is spread evenly over all nodes."""
+        n = self.node_count
+        if n == 0:
+            return []
+        offsets, targets = self.csr()
+        np = _numpy()
+        if np is not None:
+            off = np.frombuffer(offsets, dtype=np.uint32).astype(np.int64)
+            dst = np.frombuffer(targets, dtype=np.uint32).astype(np.int64)
+            outdeg = np.diff(off)
+            src = np.repeat(np.arange(n), outdeg)
+            dangling = outdeg == 0
+            inv_out = np.zeros(n)
+            inv_out[~dangling] = 1.0 / outdeg[~dangling]
+            rank = np.full(n, 1.0 / n)
+            for _ in range(max_iter):
+                flow = np.bincount(dst, weights=(rank * inv_out)[src], minlength=n)
+                new = damping * flow + (1.0 - damping + damping * rank[dangling].sum()) / n
+                delta = np.abs(new - rank).sum()
+                rank = new
+                if delta < tol:
+                    break
+            return rank.tolist()
+
+        rank = [1.0 / n] * n
+        for _ in range(max_iter):
+            flow = [0.0] * n
+            dangling_sum = 0.0
+            for u in range(n):
+                a, b = offsets[u], offsets[u + 1]
+                if a == b:
+                    dangling_sum += rank[u]
+                    continue
+                share = rank[u] / (b - a)
+                for v in targets[a:b]:
+                    flow[v] += share
+            base = (1.0 - damping + damping * dangling_sum) / n
+            new = [base + damping * f for f in flow]
+            delta = sum(abs(x - y) for x, y in zip(new, rank))
+            rank = new
+            if delta < tol:
+                break
+        return rank
+
+def build_link_graph_findings(pages: list, homepage: str, sitemap_urls=None, graph: LinkGraph = None):
+    """Graph metrics for the crawled sample. Annotates each page with inlinks/click_depth/pagerank.
+    graph is built from the pages' internal_links unless one filled during the crawl is passed.
+
+    Orphans are sitemap URLs that no other crawled page links to. That only means something when
+    every sitemap URL was crawled, so pass sitemap_urls only then; otherwise no orphan figures
+    are reported.
+    """
+    if graph is None:
+        graph = LinkGraph()
+        page_nodes = [graph.add_page(p["url"], p.get("final_url"), p.get("internal_links") or []) for p in pages]
+    else:
+        page_nodes = [graph.lookup(p["url"]) for p in pages]
+    inlinks = graph.inlinks()
+    depth = graph.click_depths(homepage)
+    rank = graph.pagerank()
+
+    for p, i in zip(pages, page_nodes):
+        p["inlinks"] = inlinks[i]
+        p["click_depth"] = depth[i]
+        p["pagerank"] = round(rank[i] * graph.node_count, 3)  # 1.0 = average page
+
+    home = graph.lookup(homepage)
+    orphans = []
+    for u in dict.fromkeys(sitemap_urls or ()):
+        i = graph.lookup(u)
+        if i is not None and i != home and inlinks[i] == 0:
+            orphans.append(u)
+
+    crawled = set(page_nodes)
+    reachable = [depth[i] for i in crawled if depth[i] is not None]
+    summary = {
+        "internal_link_edges": graph.edge_count,
+        "internal_urls_linked": graph.node_count,
+        "pages_unreachable_from_home": len(crawled) - len(reachable),
+        "max_click_depth": max(reachable) if reachable else None,
+    }
+    top = heapq.nlargest(LINK_GRAPH_EXAMPLES, crawled, key=lambda i: rank[i])
+    examples = {
+        "top_pagerank_pages": [
+            {"url": graph.urls[i], "pagerank": round(rank[i] * graph.node_count, 3), "inlinks": inlinks[i], "click_depth": depth[i]}
+            for i in top
+        ],
+    }
+    if sitemap_urls is not None:
+        summary["orphan_pages"] = len(orphans)
+        examples["orphan_examples"] = [{"url": u, "inlinks": 0} for u in orphans[:LINK_GRAPH_EXAMPLES]]
+    return summary, examples
+
+
+# ===========================
+# 🕷️ BASIC+ MINI CRAWLER (NO AHREFS)
+# ===========================
+CRAWL_TIMEOUT = 12
+MAX_PAGES_BASIC = 40
+MAX_INTERNAL_LINKS_PER_PAGE = 10
+MAX_BROKEN_LINK_CHECKS = 180  # total links to validate across sample (cap)
+CRAWL_WORKERS = 8  # concurrent page fetches
+CRAWL_MAX_PER_HOST = 4  # concurrent requests against a single host
+CRAWL_HOST_MIN_INTERVAL = 0.05  # politeness: min seconds between request starts on one host
+LINK_CHECK_WORKERS = 16  # concurrent link validations
+MAX_BROKEN_EXAMPLES = 25  # stop checking once this many broken links are found
+SITEMAP_MAX_URLS = 200000  # page URLs streamed to the sampler from one sitemap tree (the rest are only counted)
+SITEMAP_SEEN_CAPACITY = 1000000  # Bloom filter sizing for sitemap dedup (~1.8 MB whatever the sitemap size)
+SITEMAP_MAX_CHILDREN = 20  # child sitemaps followed per sitemap index
+SITEMAP_WORKERS = 4  # child sitemaps fetched/parsed concurrently
+SITEMAP_CHUNK_BYTES = 64 * 1024
+SITEMAP_BUFFER_URLS = 2000  # URLs parsed ahead of the consumer before workers block
+ROBOTS_AGENT = "claudio"  # product token looked up in robots.txt groups (falls back to "*")
+ROBOTS_MAX_CRAWL_DELAY = 10.0  # seconds; longer Crawl-delay values are clamped so audits still finish
+SAMPLE_BUCKET_DEPTH = 1  # path segments that define a sampling bucket (/blog/... vs /shop/...)
+CRAWL_MAX_DEPTH = 4  # link-crawl mode: clicks from the homepage
+FRONTIER_MAX_URLS = 20000  # queued URLs kept in link-crawl mode; later discoveries are only counted
+FRONTIER_SEEN_CAPACITY = 200000  # Bloom filter sizing for the seen-set
+FRONTIER_SEEN_ERROR = 0.001  # Bloom filter false-positive rate (a false positive skips a URL)
+TRACKING_PARAMS = {"gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl"}
+NON_HTML_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".ico", ".pdf", ".zip", ".gz",
+    ".mp3", ".mp4", ".webm", ".css", ".js", ".json", ".xml", ".woff", ".woff2", ".ttf",
+)
+
+class HostThrottle:
+    """Per-host concurrency cap + minimum spacing between request starts (thread-safe).
+
+    With a RobotsCache, a host that declares Crawl-delay is fetched one request at a time,
+    spaced by that delay; other hosts run at the default cap and interval.
+    """
+
+    def __init__(self, max_per_host: int = CRAWL_MAX_PER_HOST, min_interval: float = CRAWL_HOST_MIN_INTERVAL,
+                 robots=None):
+        self.max_per_host = max(1, max_per_host)
+        self.min_interval = max(0.0, min_interval)
+        self.robots = robots
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._intervals = {}
+        self._next_start = {}
+
+    def _host_slot(self, url: str, host: str):
+        sem = self._slots.get(host)
+        if sem is not None:
+            return sem
+        delay = self.robots.crawl_delay(url) if self.robots else None  # may fetch robots.txt: outside the lock
+        with self._lock:
+            sem = self._slots.get(host)
+            if sem is None:
+                if delay:
+                    sem = threading.BoundedSemaphore(1)
+                    self._intervals[host] = max(self.min_interval, min(delay, ROBOTS_MAX_CRAWL_DELAY))
+                else:
+                    sem = threading.BoundedSemaphore(self.max_per_host)
+                    self._intervals[host] = self.min_interval
+                self._slots[host] = sem
+        return sem
+
+    @contextmanager
+    def slot(self, url: str):
+        host = urlparse(url).netloc.lower()
+        sem = self._host_slot(url, host)
+        sem.acquire()
+        try:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, 0.0))
+                self._next_start[host] = start + self._intervals[host]
+            if start > now:
+                time.sleep(start - now)
+            yield
+        finally:
+            sem.release()
+
+def fetch_url(url: str, headers: dict, timeout: int = CRAWL_TIMEOUT, stream: bool = False):
+    try:
+        r = http_get(url, headers=headers, timeout=timeout, stream=stream)
+        return r
+    except Exception:
+        return None
+
+class RobotsRules:
+    """Parsed robots.txt for one agent (RFC 9309): the longest matching Allow/Disallow pattern
+    wins, Allow wins ties. Plain patterns compile to prefix checks, patterns using * or $ to regexes."""
+
+    def __init__(self, text: str = "", agent: str = ROBOTS_AGENT):
+        self.sitemaps = []
+        self.crawl_delay = None
+        self._rules = []  # (pattern length, allow, matcher), longest first
+        groups = {}  # agent -> (rules, crawl_delay)
+        current, in_rules = [], False
+        for raw in text.splitlines():
+            line = raw.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            key, value = (x.strip() for x in line.split(":", 1))
+            key = key.lower()
+            if key == "sitemap":
+                if value:
+                    self.sitemaps.append(value)
+            elif key == "user-agent":
+                if in_rules:
+                    current, in_rules = [], False
+                current.append(value.lower())
+                groups.setdefault(value.lower(), ([], []))
+            elif key in ("allow", "disallow", "crawl-delay") and current:
+                in_rules = True
+                for ua in current:
+                    rules, delays = groups[ua]
+                    if key == "crawl-delay":
+                        delays.append(value)
+                    elif value:
+                        rules.append((key == "allow", value))
+        self.sitemaps = list(dict.fromkeys(self.sitemaps))
+
+        rules, delays = groups.get(agent.lower()) or groups.get("*") or ([], [])
+        for allow, pattern in rules:
+            self._rules.append((len(pattern), allow, self._compile(pattern)))
+        self._rules.sort(key=lambda r: (-r[0], not r[1]))
+        for d in delays:
+            try:
+                self.crawl_delay = max(0.0, float(d))
+                break
+            except ValueError:
+                continue
+
+    @staticmethod
+    def _compile(pattern: str):
+        if "*" not in pattern and not pattern.endswith("$"):
+            return pattern
+        anchored = pattern.endswith("$")
+        body = pattern[:-1] if anchored else pattern
+        regex = ".*".join(re.escape(part) for part in body.split("*"))
+        return re.compile(regex + (r"\Z" if anchored else "")).match
+
+    @classmethod
+    def disallow_all(cls):
+        rules = cls()
+        rules._rules = [(1, False, "/")]
+        return rules
+
+    def allowed(self, url: str) -> bool:
+        p = urlsplit(url)
+        path = (p.path or "/") + ("?" + p.query if p.query else "")
+        if path == "/robots.txt":
+            return True
+        for _, allow, matcher in self._rules:
+            if path.startswith(matcher) if isinstance(matcher, str) else matcher(path):
+                return allow
+        return True
+
+class RobotsCache:
+    """robots.txt rules per origin, fetched once per audit (concurrent callers wait for the first fetch)."""
+
+    def __init__(self, headers: dict, agent: str = ROBOTS_AGENT):
+        self.headers = headers
+        self.agent = agent
+        self.blocked = 0
+        self._rules = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def rules_for(self, url: str) -> RobotsRules:
+        p = urlsplit(url)
+        origin = f"{p.scheme.lower()}://{p.netloc.lower()}"
+        rules = self._rules.get(origin)
+        if rules is not None:
+            return rules
+        with self._lock:
+            origin_lock = self._locks.setdefault(origin, threading.Lock())
+        with origin_lock:
+            rules = self._rules.get(origin)
+            if rules is None:
+                rules = self._rules[origin] = self._fetch(origin)
+        return rules
+
+    def _fetch(self, origin: str) -> RobotsRules:
+        r = fetch_url(origin + "/robots.txt", headers=self.headers)
+        if r is not None and r.status_code >= 500:
+            return RobotsRules.disallow_all()  # server error: RFC 9309 says assume full disallow
+        if r is None or r.status_code >= 400:
+            return RobotsRules(agent=self.agent)
+        return RobotsRules(r.text, agent=self.agent)
+
+    def allowed(self, url: str) -> bool:
+        if self.rules_for(url).allowed(url):
+            return True
+        with self._lock:
+            self.blocked += 1
+        return False
+
+    def crawl_delay(self, url: str):
+        return self.rules_for(url).crawl_delay
+
+def get_robots_sitemaps(base_url: str, headers: dict, robots: RobotsCache = None):
+    return (robots or RobotsCache(headers)).rules_for(base_url).sitemaps
+
+def try_default_sitemaps(base_url: str):
+    base = base_url.rstrip("/") + "/"
+    return [
+        urljoin(base, "sitemap.xml"),
+        urljoin(base, "sitemap_index.xml"),
+        urljoin(base, "sitemap-index.xml"),
+    ]
+
+def iter_sitemap_locs(r):
+    """Stream ("sitemap"|"url", loc) pairs out of a sitemap response without building the whole tree.
+
+    Handles gzipped bodies (.xml.gz served without Content-Encoding). Only <loc> elements that are
+    direct children of <url>/<sitemap> entries are returned (image/video extension locs are skipped).
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    gunzip = None
+    root = None
+    is_index = False
+    depth = 0
+    first = True
+    try:
+        for chunk in r.iter_content(SITEMAP_CHUNK_BYTES):
+            if not chunk:
+                continue
+            if first:
+                first = False
+                if chunk[:2] == b"\x1f\x8b":
+                    gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            parser.feed(gunzip.decompress(chunk) if gunzip else chunk)
+            for event, el in parser.read_events():
+                tag = el.tag.lower() if isinstance(el.tag, str) else ""
+                if event == "start":
+                    depth += 1
+                    if root is None:
+                        root = el
+                        is_index = tag.endswith("sitemapindex")
+                    continue
+                depth -= 1
+                if depth == 2 and tag.endswith("loc") and el.text:
+                    yield ("sitemap" if is_index else "url"), el.text.strip()
+                elif depth == 1:
+                    root.clear()  # entry done: drop it so memory stays flat
+    except (ET.ParseError, zlib.error):
+        return
+
+def iter_sitemap_urls(sitemap_url: str, headers: dict, max_urls: int = SITEMAP_MAX_URLS,
+                      max_children: int = SITEMAP_MAX_CHILDREN, workers: int = SITEMAP_WORKERS,
+                      throttle: HostThrottle = None, stats: dict = None):
+    """Yield deduped page URLs from a sitemap (or sitemap index) as they are parsed.
+
+    Child sitemaps are fetched concurrently by a small worker pool; a bounded buffer applies
+    backpressure and a Bloom filter dedups, so memory does not grow with sitemap size. Past
+    max_urls the tree is still parsed to the end but URLs are only counted: `stats["urls"]` is the
+    distinct URLs discovered, `stats["streamed"]` the ones yielded.
+    """
+    throttle = throttle or HostThrottle()
+    stats = stats if stats is not None else {}
+    stats["urls"] = stats["streamed"] = 0
+
+    out = queue.Queue(maxsize=SITEMAP_BUFFER_URLS)
+    todo = queue.Queue()
+    todo.put(sitemap_url)
+    lock = threading.Lock()
+    seen_sitemaps = {sitemap_url}
+    state = {"pending": 1}
+    stop = threading.Event()
+    finished = object()
+
+    def _emit(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _process(sm):
+        children = 0
+        with throttle.slot(sm):
+            r = fetch_url(sm, headers=headers, stream=True)
+            if r is None:
+                return
+            try:
+                if r.status_code >= 400:
+                    return
+                for kind, loc in iter_sitemap_locs(r):
+                    if stop.is_set():
+                        return
+                    if kind == "url":
+                        if not _emit(loc):
+                            return
+                        continue
+                    with lock:
+                        if children >= max_children or loc in seen_sitemaps:
+                            continue
+                        seen_sitemaps.add(loc)
+                        state["pending"] += 1
+                    children += 1
+                    todo.put(loc)
+            finally:
+                r.close()
+
+    def _worker():
+        while not stop.is_set():
+            try:
+                sm = todo.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                _process(sm)
+            except Exception:
+                pass
+            finally:
+                with lock:
+                    state["pending"] -= 1
+                    done = state["pending"] == 0
+                if done:
+                    _emit(finished)
+
+    threads = [threading.Thread(target=_worker, daemon=True) for _ in range(max(1, workers))]
+    for t in threads:
+        t.start()
+
+    seen = BloomFilter(capacity=SITEMAP_SEEN_CAPACITY)
+    try:
+        while True:
+            item = out.get()
+            if item is finished:
+                break
+            if not seen.add(item):
+                continue
+            stats["urls"] += 1
+            if stats["streamed"] < max_urls:
+                stats["streamed"] += 1
+                yield item
+    finally:
+        stop.set()
+
+def pick_sample_urls(urls, homepage_url: str, max_pages: int = MAX_PAGES_BASIC, bucket_depth: int = SAMPLE_BUCKET_DEPTH,
+                     seed=None):
+    """Stratified sample of a URL stream in one pass: the homepage plus URLs spread over path buckets.
+
+    URLs are bucketed by their first `bucket_depth` path segments and each bucket keeps a reservoir
+    (Algorithm R) of up to max_pages URLs and a Bloom filter dedups, so memory is bounded by
+    buckets x max_pages, not by the stream. Slots are then shared out: one per bucket, the rest
+    proportional to bucket size. With more buckets than slots, each slot goes to a bucket drawn at
+    random weighted by its size (a uniform sample of the stream). The RNG is seeded from the homepage by default so reruns pick
+    the same sample.
+    """
+    rng = random.Random(seed if seed is not None else homepage_url)
+    sample = [homepage_url] if homepage_url else []
+    seen = BloomFilter()
+    if homepage_url:
+        seen.add(canonicalize_url(homepage_url))
+    buckets = {}  # bucket -> [urls seen, reservoir]
+
+    for u in urls:
+        if not isinstance(u, str) or not u.startswith(("http://", "https://")):
+            continue
+        key = canonicalize_url(u)
+        if not key or not seen.add(key):
+            continue
+        path = urlsplit(key).path.strip("/")
+        bucket = "/".join(path.split("/")[:bucket_depth]) if path else "_root"
+        b = buckets.get(bucket)
+        if b is None:
+            b = buckets[bucket] = [0, []]
+        b[0] += 1
+        if len(b[1]) < max_pages:
+            b[1].append(u)
+        else:
+            j = rng.randrange(b[0])
+            if j < max_pages:
+                b[1][j] = u
+
+    slots = max_pages - len(sample)
+    if slots <= 0 or not buckets:
+        return sample[:max_pages]
+
+    ranked = sorted(buckets.items(), key=lambda kv: -kv[1][0])
+    alloc = {name: 0 for name, _ in ranked}
+    if len(ranked) > slots:
+        # too many buckets to give each a slot (a flat /post-slug/ site has one per URL): draw
+        # distinct stream positions and credit the bucket each falls in, instead of the first N
+        bounds = list(itertools.accumulate(b[0] for _, b in ranked))
+        for pos in rng.sample(range(bounds[-1]), slots):
+            alloc[ranked[bisect.bisect_right(bounds, pos)][0]] += 1
+    else:
+        for name in alloc:
+            alloc[name] = 1
+    left = slots - sum(alloc.values())
+    if left > 0:
+        spare = {name: b[0] - alloc[name] for name, b in ranked}
+        total_spare = sum(spare.values())
+        if total_spare:
+            shares = {name: left * n / total_spare for name, n in spare.items()}
+            for name in alloc:
+                alloc[name] += min(int(shares[name]), spare[name])
+            # largest remainders take the slots lost to rounding
+            left = slots - sum(alloc.values())
+            for name in sorted(alloc, key=lambda n: shares[n] - int(shares[n]), reverse=True):
+                if left <= 0:
+                    break
+                if alloc[name] < buckets[name][0]:
+                    alloc[name] += 1
+                    left -= 1
+
+    for name, b in ranked:
+        reservoir = b[1]
+        k = min(alloc[name], len(reservoir))
+        sample.extend(reservoir if k == len(reservoir) else rng.sample(reservoir, k))
+    return sample[:max_pages]
+
+def canonicalize_url(url: str) -> str:
+    """Crawl key for a URL: lowercase scheme/host, default port and fragment dropped,
+    tracking params (utm_*, gclid, ...) removed and the query sorted. "" if not http(s)."""
+    try:
+        p = urlsplit(url.strip())
+        scheme = p.scheme.lower()
+        host = (p.hostname or "").rstrip(".")
+        port = p.port
+    except ValueError:
+        return ""
+    if scheme not in ("http", "https") or not host:
+        return ""
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and port != (443 if scheme == "https" else 80):
+        host = f"{host}:{port}"
+    params = sorted(
+        (k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, p.path or "/", urlencode(params), ""))
+
+class BloomFilter:
+    """Fixed-size probabilistic set: no false negatives, ~error_rate false positives at capacity."""
+
+    def __init__(self, capacity: int = FRONTIER_SEEN_CAPACITY, error_rate: float = FRONTIER_SEEN_ERROR):
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def add(self, item: str) -> bool:
+        """Add item; True if it was not (probably) present before."""
+        new = False
+        for pos in self._positions(item):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not self.bits[byte] & bit:
+                self.bits[byte] |= bit
+                new = True
+        self.count += new
+        return new
+
+class CrawlFrontier:
+    """Priority frontier for link-crawl mode: shallow URLs first, then short paths before long or
+    parameterised ones. Seen URLs live in a Bloom filter, and the queue itself is capped."""
+
+    def __init__(self, base_domain: str, max_depth: int = CRAWL_MAX_DEPTH, max_size: int = FRONTIER_MAX_URLS,
+                 robots: RobotsCache = None):
+        self.base_domain = base_domain
+        self.robots = robots
+        self.max_depth = max_depth
+        self.max_size = max_size
+        self.seen = BloomFilter()
+        self.discovered = 0
+        self.dropped = 0
+        self._heap = []
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def mark_seen(self, url: str):
+        url = canonicalize_url(url)
+        if url:
+            self.seen.add(url)
+
+    def push(self, url: str, depth: int) -> bool:
+        if depth > self.max_depth:
+            return False
+        url = canonicalize_url(url)
+        if not url or normalize_domain(url) != self.base_domain:
+            return False
+        path = urlsplit(url).path
+        if path.lower().endswith(NON_HTML_EXTENSIONS) or not self.seen.add(url):
+            return False
+        if self.robots and not self.robots.allowed(url):
+            return False
+        self.discovered += 1
+        if len(self._heap) >= self.max_size:
+            self.dropped += 1
+            return False
+        self._seq += 1
+        heapq.heappush(self._heap, (depth, path.count("/"), "?" in url, self._seq, url))
+        return True
+
+    def pop(self):
+        """(url, depth) of the best queued URL, or None when empty."""
+        if not self._heap:
+            return None
+        depth, _, _, _, url = heapq.heappop(self._heap)
+        return url, depth
+
+def extract_page_signals(url: str, base_domain: str, headers: dict):
+    r = fetch_url(url, headers=headers)
+    if not r:
+        return {"url": url, "final_url": url, "status": None, "error": "request_failed"}
+
+    final_url = r.url
+    status = r.status_code
+    redirect_chain = [h.url for h in r.history] + [final_url] if r.history else []
+    content_type = (r.headers.get("Content-Type") or "").lower()
+    if "text/html" not in content_type:
+        return {"url": url, "final_url": final_url, "status": status, "content_type": content_type, "error": "non_html",
+                "redirect_hops": len(r.history), "redirect_chain": redirect_chain}
+
+    sig = parse_html_signals(r.content, response_html_encoding(r))
+
+    title = (sig.title or "").strip()
+    meta_desc = (sig.meta_description or "").strip()
+    canonical = (sig.canonical or "").strip()
+    robots_meta = (sig.robots_meta or "").strip().lower()
+
+    internal_links = []
+    seen_links = set()
+    for href in sig.hrefs:
+        if not href or href.startswith(("#", "mailto:", "tel:", "javascript:")):
+            continue
+        # canonical form, so utm/fragment variants of one URL are linked (and link-checked) once
+        abs_url = canonicalize_url(href if href.startswith(("http://", "https://")) else urljoin(final_url, href))
+        if abs_url and abs_url not in seen_links and normalize_domain(abs_url) == base_domain:
+            seen_links.add(abs_url)
+            internal_links.append(abs_url)
+
+    return {
+        "url": url,
+        "final_url": final_url,
+        "status": status,
+        "title": title,
+        "title_len": len(title),
+        "meta": meta_desc,
+        "meta_len": len(meta_desc),
+        "canonical": canonical,
+        "robots_meta": robots_meta,
+        "h1_count": len(sig.h1_tags),
+        "word_count": sig.word_count,
+        "images_total": sig.images_total,
+        "images_missing_alt": sig.images_missing_alt,
+        "hreflang_count": sig.hreflang_count,
+        "jsonld_count": sig.jsonld_count,
+        "sample_internal_links": internal_links[:MAX_INTERNAL_LINKS_PER_PAGE],
+        "redirect_hops": len(r.history),
+        "simhash": sig.simhash,
+        "internal_links": internal_links,
+        "redirect_chain": redirect_chain
+    }
+
+def crawl_pages(urls: list[str], base_domain: str, headers: dict, workers: int = CRAWL_WORKERS,
+                throttle: HostThrottle = None, on_page=None, on_result=None):
+    """Fetch + extract signals for `urls` concurrently. Results keep the input order.
+
+    on_page(done, total) is called as each page finishes. on_result(page), if given, sees every
+    page in input order and its return value is what gets kept (e.g. a trimmed row).
+    """
+    throttle = throttle or HostThrottle()
+
+    def _one(u):
+        with throttle.slot(u):
+            return extract_page_signals(u, base_domain=base_domain, headers=headers)
+
+    if not urls:
+        return []
+    pages = [None] * len(urls)
+    ready = {}  # finished out of order, waiting for earlier pages
+    next_i = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls)))) as pool:
+        futures = {pool.submit(_one, u): i for i, u in enumerate(urls)}
+        for done, fut in enumerate(as_completed(futures), start=1):
+            ready[futures[fut]] = fut.result()
+            while next_i in ready:
+                page = ready.pop(next_i)
+                pages[next_i] = on_result(page) if on_result else page
+                next_i += 1
+            if on_page:
+                on_page(done, len(urls))
+    return pages
+
+def frontier_crawl(start_url: str, base_domain: str, headers: dict, max_pages: int = MAX_PAGES_BASIC,
+                   max_depth: int = CRAWL_MAX_DEPTH, workers: int = CRAWL_WORKERS,
+                   throttle: HostThrottle = None, robots: RobotsCache = None, on_page=None, on_result=None,
+                   stats: dict = None):
+    """Follow internal links breadth-first from start_url until max_pages pages are fetched.
+
+    Pages come back in completion order with a crawl_depth key. on_page(done, max_pages) is
+    called as each page finishes; on_result(page) as in crawl_pages, after its links are queued.
+    stats gets discovered/queued_left/dropped/max_depth counts.
+    """
+    throttle = throttle or HostThrottle()
+    frontier = CrawlFrontier(base_domain, max_depth=max_depth, robots=robots)
+    frontier.push(start_url, 0)
+    pages = []
+
+    def _one(u):
+        with throttle.slot(u):
+            return extract_page_signals(u, base_domain=base_domain, headers=headers)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        inflight = {}
+        while True:
+            while len(inflight) < workers and len(pages) + len(inflight) < max_pages:
+                item = frontier.pop()
+                if item is None:
+                    break
+                inflight[pool.submit(_one, item[0])] = item[1]
+            if not inflight:
+                break
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                depth = inflight.pop(fut)
+                page = fut.result()
+                page["crawl_depth"] = depth
+                if page.get("final_url"):
+                    frontier.mark_seen(page["final_url"])
+                for ln in page.get("internal_links") or []:
+                    frontier.push(ln, depth + 1)
+                pages.append(on_result(page) if on_result else page)
+                if on_page:
+                    on_page(len(pages), max_pages)
+
+    if stats is not None:
+        stats["discovered"] = frontier.discovered
+        stats["queued_left"] = len(frontier)
+        stats["dropped"] = frontier.dropped
+        stats["max_depth"] = max((p["crawl_depth"] for p in pages), default=0)
+    return pages
+
+def link_status(link: str, headers: dict):
+    """HEAD first; on an error status confirm with a streamed GET (headers only, body never read)."""
+    session = get_http_session()
+    try:
+        r = session.head(link, headers=headers, timeout=CRAWL_TIMEOUT, allow_redirects=True)
+        code = r.status_code
+        r.close()
+        if code >= 400 or code == 0:
+            with session.get(link, headers=headers, timeout=CRAWL_TIMEOUT, allow_redirects=True, stream=True) as rg:
+                code = rg.status_code
+        return code
+    except Exception:
+        return None
+
+def check_links_for_broken(links: list[str], headers: dict, workers: int = LINK_CHECK_WORKERS,
+                           max_broken: int = MAX_BROKEN_EXAMPLES, throttle: HostThrottle = None, on_checked=None):
+    broken = []
+    ok = 0
+    if not links:
+        return ok, broken
+
+    throttle = throttle or HostThrottle()
+    quota_hit = threading.Event()
+
+    def _one(link):
+        if quota_hit.is_set():
+            return None
+        with throttle.slot(link):
+            if quota_hit.is_set():
+                return None
+            return link, link_status(link, headers)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(links))))
+    try:
+        futures = [pool.submit(_one, link) for link in links]
+        for fut in as_completed(futures):
+            res = fut.result()
+            if res is None:
+                continue
+            link, code = res
+            if code is None or code >= 400:
+                broken.append({"url": link, "status": code})
+            else:
+                ok += 1
+            if on_checked:
+                on_checked(ok + len(broken), len(links))
+            if len(broken) >= max_broken:
+                quota_hit.set()
+                break
+    finally:
+        # Early cancellation: drop queued checks, let in-flight ones finish in the background
+        pool.shutdown(wait=False, cancel_futures=True)
+    return ok, broken
+
+FINDING_EXAMPLES = 10  # example URLs kept per check
+NEAR_DUP_MAX_DISTANCE = 6  # max differing SimHash bits for two pages to count as near-duplicates
+NEAR_DUP_BANDS = 8  # 8 x 8-bit LSH bands: pairs up to 7 bits apart always share a band (pigeonhole)
+NEAR_DUP_BUCKET_CAP = 64  # pages compared per band bucket (stops boilerplate buckets going quadratic)
+DUPLICATE_GROUP_URLS = 5  # example URLs kept per duplicate group
+DUPLICATE_TOP_GROUPS = 5  # duplicate groups reported per field
+
+class SimHashIndex:
+    """LSH index over 64-bit SimHash fingerprints that clusters near-duplicate pages.
+
+    Fingerprints are split into bands; only pages sharing a band value are compared, and
+    matches are merged with union-find. Each cluster keeps its size and a few example URLs.
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUP_MAX_DISTANCE, bands: int = NEAR_DUP_BANDS,
+                 bucket_cap: int = NEAR_DUP_BUCKET_CAP, group_urls: int = DUPLICATE_GROUP_URLS):
+        self.max_distance = max_distance
+        self.band_bits = 64 // bands
+        self.bucket_cap = bucket_cap
+        self.group_urls = group_urls
+        self.fingerprints = []
+        self.parent = []
+        self.size = []
+        self.urls = {}
+        self.buckets = [{} for _ in range(bands)]
+        self.duplicated_pages = 0
+
+    def _root(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def _union(self, a: int, b: int):
+        ra, rb = self._root(a), self._root(b)
+        if ra == rb:
+            return
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        sa, sb = self.size[ra], self.size[rb]
+        self.duplicated_pages += sa + sb - (sa if sa > 1 else 0) - (sb if sb > 1 else 0)
+        self.parent[rb] = ra
+        self.size[ra] = sa + sb
+        urls = self.urls[ra]
+        for u in self.urls.pop(rb):
+            if len(urls) >= self.group_urls:
+                break
+            urls.append(u)
+
+    def add(self, fingerprint: int, url: str):
+        i = len(self.fingerprints)
+        self.fingerprints.append(fingerprint)
+        self.parent.append(i)
+        self.size.append(1)
+        self.urls[i] = [url]
+        mask = (1 << self.band_bits) - 1
+        seen = set()
+        for b, bucket in enumerate(self.buckets):
+            members = bucket.setdefault((fingerprint >> (b * self.band_bits)) & mask, [])
+            for j in members:
+                if j not in seen:
+                    seen.add(j)
+                    if bin(fingerprint ^ self.fingerprints[j]).count("1") <= self.max_distance:
+                        self._union(i, j)
+            if len(members) < self.bucket_cap:
+                members.append(i)
+
+    def top_groups(self, k: int) -> list:
+        roots = (r for r in self.urls if self.size[r] > 1)
+        return [
+            {"count": self.size[r], "urls": self.urls[r]}
+            for r in heapq.nlargest(k, roots, key=lambda r: self.size[r])
+        ]
+
+class SiteFindingsAggregator:
+    """Incremental version of the site-level checks: feed page dicts one at a time with add().
+
+    Memory does not depend on crawl size beyond one small record per distinct title/meta
+    (hash key, count, truncated value, a few example URLs); the biggest duplicate groups
+    are picked with a heap at the end.
+    """
+
+    def __init__(self, base_domain: str, group_urls: int = DUPLICATE_GROUP_URLS,
+                 top_groups: int = DUPLICATE_TOP_GROUPS, max_examples: int = FINDING_EXAMPLES):
+        self.base_domain = base_domain
+        self.group_urls = group_urls
+        self.top_groups = top_groups
+        self.max_examples = max_examples
+        self.summary = {
+            "analyzed_pages": 0,
+            "status_4xx_5xx": 0,
+            "redirects": 0,
+            "missing_title": 0,
+            "missing_meta": 0,
+            "missing_h1": 0,
+            "multiple_h1": 0,
+            "noindex_pages": 0,
+            "missing_canonical": 0,
+            "canonical_mismatch": 0,
+            "thin_pages_lt_250w": 0,
+            "total_images_missing_alt": 0,
+            "pages_with_schema": 0,
+            "pages_with_hreflang": 0,
+            "near_duplicate_pages": 0,
+            "redirect_chains": 0
+        }
+        self.examples = {
+            "duplicate_titles": [],
+            "duplicate_meta": [],
+            "noindex_examples": [],
+            "canonical_examples": [],
+            "thin_examples": [],
+            "status_examples": [],
+            "redirect_chain_examples": []
+        }
+        self._titles = {}
+        self._metas = {}
+        self._near = SimHashIndex(group_urls=group_urls)
+
+    def _example(self, key: str, item: dict):
+        if len(self.examples[key]) < self.max_examples:
+            self.examples[key].append(item)
+
+    def _group(self, groups: dict, value: str, url: str, max_len: int):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+        g = groups.get(digest)
+        if g is None:
+            g = groups[digest] = [0, value[:max_len], []]
+        g[0] += 1
+        if len(g[2]) < self.group_urls:
+            g[2].append(url)
+
+    def add(self, p: dict):
+        summary = self.summary
+        summary["analyzed_pages"] += 1
+        status = p.get("status")
+        url = p.get("final_url") or p.get("url")
+
+        if status is None or (isinstance(status, int) and status >= 400):
+            summary["status_4xx_5xx"] += 1
+            self._example("status_examples", {"url": url, "status": status})
+        else:
+            if (p.get("final_url") or p.get("url")) != p.get("url"):
+                summary["redirects"] += 1
+        chain = p.get("redirect_chain") or []
+        if len(chain) > 2:
+            summary["redirect_chains"] += 1
+            self._example("redirect_chain_examples", {"url": p.get("url"), "hops": len(chain) - 1, "chain": chain})
+
+        title = (p.get("title") or "").strip()
+        meta = (p.get("meta") or "").strip()
+
+        if not title:
+            summary["missing_title"] += 1
+        else:
+            self._group(self._titles, title, url, 140)
+
+        if not meta:
+            summary["missing_meta"] += 1
+        else:
+            self._group(self._metas, meta, url, 160)
+
+        h1c = safe_int(p.get("h1_count"), 0)
+        if h1c == 0:
+            summary["missing_h1"] += 1
+        elif h1c > 1:
+            summary["multiple_h1"] += 1
+
+        robots = (p.get("robots_meta") or "").lower()
+        if "noindex" in robots:
+            summary["noindex_pages"] += 1
+            self._example("noindex_examples", {"url": url, "robots": robots})
+
+        canonical = (p.get("canonical") or "").strip()
+        if not canonical:
+            summary["missing_canonical"] += 1
+        else:
+            try:
+                c_abs = canonical
+                if canonical.startswith("/"):
+                    c_abs = urljoin(url, canonical)
+                if normalize_domain(c_abs) != self.base_domain:
+                    summary["canonical_mismatch"] += 1
+                    self._example("canonical_examples", {"url": url, "canonical": canonical})
+            except Exception:
+                pass
+
+        wc = safe_int(p.get("word_count"), 0)
+        if 0 < wc < 250:
+            summary["thin_pages_lt_250w"] += 1
+            self._example("thin_examples", {"url": url, "word_count": wc})
+
+        summary["total_images_missing_alt"] += safe_int(p.get("images_missing_alt"), 0)
+        if safe_int(p.get("jsonld_count"), 0) > 0:
+            summary["pages_with_schema"] += 1
+        if safe_int(p.get("hreflang_count"), 0) > 0:
+            summary["pages_with_hreflang"] += 1
+        if p.get("simhash") is not None:
+            self._near.add(p["simhash"], url)
+
+    def _top_duplicates(self, groups: dict):
+        dups = (g for g in groups.values() if g[0] > 1)
+        # nlargest is stable, so ties keep first-seen order
+        return [
+            {"value": value, "count": count, "urls": urls}
+            for count, value, urls in heapq.nlargest(self.top_groups, dups, key=lambda g: g[0])
+        ]
+
+    def result(self):
+        examples = dict(self.examples)
+        examples["duplicate_titles"] = self._top_duplicates(self._titles)
+        examples["duplicate_meta"] = self._top_duplicates(self._metas)
+        examples["near_duplicate_content"] = self._near.top_groups(self.top_groups)
+        summary = dict(self.summary)
+        summary["near_duplicate_pages"] = self._near.duplicated_pages
+        return summary, examples
+
+def build_site_level_findings(pages, base_domain: str):
+    agg = SiteFindingsAggregator(base_domain)
+    for p in pages:
+        agg.add(p)
+    return agg.result()
+
+def basic_real_audit(url_input: str, max_pages: int = MAX_PAGES_BASIC, workers: int = CRAWL_WORKERS, progress=None):
+    """Crawl a sample of the site. progress(pct, message) reports 22-65% of the overall audit."""
+    progress = progress or no_progress
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+    base_domain = normalize_domain(url_input)
+    if not base_domain:
+        raise ValueError("Invalid URL/domain")
+
+    base_url = url_input if url_input.startswith(("http://", "https://")) else "https://" + url_input
+    p = urlparse(base_url)
+    base_url = f"{p.scheme}://{p.netloc}"
+
+    progress(22, "🕷️ Reading robots.txt and sitemaps...")
+    robots = RobotsCache(headers)  # every fetch below is gated by robots.txt and paced by its Crawl-delay
+    throttle = HostThrottle(robots=robots)
+    sitemaps = get_robots_sitemaps(base_url, headers=headers, robots=robots)
+    if not sitemaps:
+        sitemaps = try_default_sitemaps(base_url)
+
+    homepage = base_url
+    findings = SiteFindingsAggregator(base_domain)
+    graph = LinkGraph()
+
+    def collect(page):
+        # full link lists and fingerprints only feed the aggregates; the kept row stays small
+        findings.add(page)
+        graph.add_page(page["url"], page.get("final_url"), page.pop("internal_links", None) or [])
+        page.pop("simhash", None)
+        page.pop("redirect_chain", None)
+        return page
+
+    sample_urls = None
+    for sm in sitemaps:
+        # sampling consumes the sitemap stream directly, no intermediate URL list
+        sitemap_stats = {}
+        stream = iter_sitemap_urls(sm, headers=headers, throttle=throttle, stats=sitemap_stats)
+        sample = pick_sample_urls((u for u in stream if robots.allowed(u)), homepage, max_pages=max_pages)
+        if sitemap_stats.get("urls"):
+            sample_urls = [u for u in sample if u != homepage or robots.allowed(u)]
+            discovery_method = f"robots/sitemap ({sm})"
+            urls_discovered_count = sitemap_stats["urls"]
+            urls_streamed_count = sitemap_stats["streamed"]
+            break
+
+    if sample_urls:
+        note = f" (from the first {urls_streamed_count})" if urls_streamed_count < urls_discovered_count else ""
+        progress(25, f"🕷️ Sampled {len(sample_urls)} of {urls_discovered_count} discovered URLs{note}")
+        pages = crawl_pages(
+            sample_urls, base_domain=base_domain, headers=headers, workers=workers, throttle=throttle, on_result=collect,
+            on_page=lambda done, total: progress(25 + 30 * done // total, f"🕷️ Fetched {done}/{total} pages"),
+        )
+    else:
+        progress(25, "🕷️ No sitemap found, following links from the homepage...")
+        frontier_stats = {}
+        pages = frontier_crawl(
+            homepage, base_domain=base_domain, headers=headers, max_pages=max_pages, workers=workers,
+            throttle=throttle, robots=robots, stats=frontier_stats, on_result=collect,
+            on_page=lambda done, total: progress(25 + 30 * done // total, f"🕷️ Crawled {done}/{total} pages"),
+        )
+        discovery_method = f"link crawl from homepage (no sitemap found, depth <= {CRAWL_MAX_DEPTH})"
+        urls_discovered_count = frontier_stats["discovered"]
+
+    crawl_summary, examples = findings.result()
+    # orphans need the whole sitemap crawled; a sample would make most pages look orphaned
+    whole_sitemap = bool(sample_urls) and len(sample_urls) >= urls_discovered_count
+    graph_summary, graph_examples = build_link_graph_findings(
+        pages, homepage, sitemap_urls=sample_urls if whole_sitemap else None, graph=graph,
+    )
+    crawl_summary.update(graph_summary)
+    examples.update(graph_examples)
+
+    all_links = {}  # insertion-ordered set
+    for pz in pages:
+        for ln in (pz.get("sample_internal_links") or []):
+            all_links.setdefault(ln)
+            if len(all_links) >= MAX_BROKEN_LINK_CHECKS:
+                break
+        if len(all_links) >= MAX_BROKEN_LINK_CHECKS:
+            break
+    all_links = [ln for ln in all_links if robots.allowed(ln)]
+
+    ok_count, broken_examples = check_links_for_broken(
+        all_links, headers=headers, throttle=throttle,
+        on_checked=lambda done, total: progress(55 + 10 * done // total, f"🔗 Checked {done}/{total} internal links"),
+    )
+    crawl_summary["broken_internal_links_checked"] = len(all_links)
+    crawl_summary["broken_internal_links_found"] = len(broken_examples)
+    examples["broken_links"] = broken_examples
+    crawl_summary["robots_blocked_urls"] = robots.blocked
+    crawl_summary["robots_crawl_delay"] = robots.crawl_delay(homepage)
+
+    context = {
+        "domain": base_domain,
+        "audit_date": datetime.now().strftime("%B %Y"),
+        "discovery_method": discovery_method,
+        "urls_discovered": urls_discovered_count,
+        "urls_analyzed": len(pages),
+        "crawl_summary": crawl_summary,
+        "pages": pages,
+        "examples": examples
+    }
+    return context
+
+
+# ===========================
+# 🔍 AHREFS: SITE EXPLORER (metrics/keywords/backlinks/refdomains/competitors)
+# ===========================
+def get_site_explorer_bundle(domain: str, country: str = "us"):
+    bundle = {
+        "metrics": {},
+        "top_keywords": [],
+        "refdomains": [],
+        "backlinks": [],
+        "competitors": []
+    }
+
+    if not (AHREFS_AVAILABLE or AHREFS_OFFLINE):
+        return bundle
+
+    # The five endpoints are independent: fetch them together, the shared limiter paces them
+    base = "https://api.ahrefs.com/v3/site-explorer/"
+    calls = {
+        "metrics": (base + "metrics", {"target": domain, "date": datetime.now().strftime("%Y-%m-%d")}),
+        "keywords": (base + "organic-keywords", {"target": domain, "limit": 20, "country": country, "order_by": "traffic:desc"}),
+        "refdomains": (base + "refdomains", {"target": domain, "limit": 10, "order_by": "domain_rating:desc"}),
+        "backlinks": (base + "all-backlinks", {"target": domain, "limit": 10, "order_by": "domain_rating:desc"}),
+        "competitors": (base + "organic-competitors", {"target": domain, "limit": 5, "country": country}),
+    }
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        futures = {name: pool.submit(ahrefs_get, url, params) for name, (url, params) in calls.items()}
+        results = {name: fut.result() for name, fut in futures.items()}
+
+    code, data = results["metrics"]
+    if code == 200 and isinstance(data, dict):
+        bundle["metrics"] = data.get("metrics", data)
+
+    code, data = results["keywords"]
+    if code == 200 and isinstance(data, dict):
+        kws = data.get("keywords") or data.get("data") or []
+        if isinstance(kws, list):
+            for it in kws[:10]:
+                bundle["top_keywords"].append({
+                    "keyword": it.get("keyword") or it.get("kw") or "",
+                    "position": it.get("position") or it.get("pos") or "",
+                    "volume": it.get("volume") or it.get("vol") or "",
+                    "traffic": it.get("traffic") or it.get("traf") or "",
+                    "value": it.get("traffic_value") or it.get("value") or "",
+                    "url": it.get("url") or it.get("ranking_url") or ""
+                })
+
+    code, data = results["refdomains"]
+    if code == 200 and isinstance(data, dict):
+        rds = data.get("refdomains") or data.get("data") or []
+        if isinstance(rds, list):
+            bundle["refdomains"] = rds[:10]
+
+    code, data = results["backlinks"]
+    if code == 200 and isinstance(data, dict):
+        bls = data.get("backlinks") or data.get("data") or []
+        if isinstance(bls, list):
+            bundle["backlinks"] = bls[:10]
+
+    code, data = results["competitors"]
+    if code == 200 and isinstance(data, dict):
+        comps = data.get("competitors") or data.get("data") or []
+        if isinstance(comps, list):
+            bundle["competitors"] = comps[:5]
+
+    return bundle
+
+
+# ===========================
+# 🔍 AHREFS: SITE AUDIT (projects/issues/page-explorer) — BEST EFFORT
+# If API access is restricted, Full will still run with Explorer-only data.
+# ===========================
+def site_audit_projects():
+    url = "https://api.ahrefs.com/v3/site-audit/projects"
+    code, data = ahrefs_get(url, {}, timeout=30)
+    return code, data
+
+def pick_project_for_domain(projects_payload: dict, domain: str):
+    if not isinstance(projects_payload, dict):
+        return None, None
+
+    projects = projects_payload.get("projects")
+    if projects is None:
+        for k in ("data", "items", "result"):
+            if isinstance(projects_payload.get(k), list):
+                projects = projects_payload.get(k)
+                break
+    if not isinstance(projects, list):
+        return None, None
+
+    matches = []
+    for p in projects:
+        target = (p.get("target") or p.get("domain") or p.get("project_target") or "")
+        if normalize_domain(target) == domain:
+            ts = p.get("crawl_timestamp") or p.get("last_crawl") or p.get("updated_at") or ""
+            pid = p.get("project_id") or p.get("id") or p.get("uuid")
+            if pid:
+                matches.append((str(ts), str(pid), p))
+
+    if not matches:
+        return None, None
+
+    matches.sort(reverse=True, key=lambda x: x[0])
+    _, pid, pobj = matches[0]
+    return pid, pobj
+
+def site_audit_issues(project_id: str):
+    url = "https://api.ahrefs.com/v3/site-audit/issues"
+    code, data = ahrefs_get(url, {"project_id": project_id}, timeout=30)
+    return code, data
+
+def extract_issue_list(issues_payload: dict):
+    if not isinstance(issues_payload, dict):
+        return []
+    for k in ("issues", "data", "items", "result"):
+        v = issues_payload.get(k)
+        if isinstance(v, list):
+            return v
+    return []
+
+def find_issue_id_and_count(issues: list, patterns: list[str]):
+    best_id = None
+    best_cnt = 0
+    for it in issues:
+        name = (it.get("name") or it.get("title") or it.get("issue_name") or "").lower()
+        if not name:
+            continue
+        if any(p in name for p in patterns):
+            iid = it.get("issue_id") or it.get("id") or it.get("uuid")
+            cnt = it.get("urls_affected") or it.get("affected_urls") or it.get("affected_pages") or it.get("count") or 0
+            cnt = safe_int(cnt, 0)
+            if iid and cnt >= best_cnt:
+                best_id = str(iid)
+                best_cnt = cnt
+    return best_id, best_cnt
+
+def site_audit_page_explorer(project_id: str, issue_id: str, limit: int = 200, offset: int = 0):
+    url = "https://api.ahrefs.com/v3/site-audit/page-explorer"
+    params = {"project_id": project_id, "issue_id": issue_id, "limit": limit, "offset": offset}
+    code, data = ahrefs_get(url, params, timeout=30)
+    return code, data
+
+def extract_page_rows(payload: dict):
+    if not isinstance(payload, dict):
+        return []
+    for k in ("pages", "urls", "data", "items", "result"):
+        v = payload.get(k)
+        if isinstance(v, list):
+            return v
+    return []
+
+SITE_AUDIT_PAGE_SIZE = 200
+SITE_AUDIT_PAGE_WORKERS = 4  # offset pages prefetched at once per issue
+SITE_AUDIT_ISSUE_WORKERS = 6  # issues whose first window is fetched ahead (requests are still paced by ahrefs_limiter)
+XLSX_MAX_ROWS_PER_SHEET = 50000  # affected URLs fetched and exported per issue sheet
+
+def issue_page_window(offset: int, max_rows: int = XLSX_MAX_ROWS_PER_SHEET, expected_rows: int = 0) -> tuple:
+    """(limit, offsets) of the next window of page-explorer calls for an issue, starting at offset."""
+    limit = min(SITE_AUDIT_PAGE_SIZE, max_rows)
+    if limit <= 0:
+        return limit, []
+    expected = min(safe_int(expected_rows, 0), max_rows)
+    width = max(1, min(SITE_AUDIT_PAGE_WORKERS, -(-(expected - offset) // limit)))  # pages the count still covers
+    return limit, [off for off in range(offset, offset + width * limit, limit) if off < max_rows]
+
+def iter_issue_pages(project_id: str, issue_id: str, max_rows: int = XLSX_MAX_ROWS_PER_SHEET, expected_rows: int = 0,
+                     first_window: list = None):
+    """Yield page-explorer row chunks for one issue until a short page comes back or max_rows is reached.
+
+    Offsets the affected-URL count accounts for are requested SITE_AUDIT_PAGE_WORKERS at a time, so an
+    overstated count wastes at most one window of calls. Past the count (or without one) pages are
+    walked one after another for as long as they come back full. first_window, if given, holds
+    futures already submitted for the offsets of issue_page_window(0, ...), in order.
+    """
+    offset, fetched = 0, 0
+    with ThreadPoolExecutor(max_workers=SITE_AUDIT_PAGE_WORKERS) as pool:
+        while fetched < max_rows:
+            limit, offsets = issue_page_window(offset, max_rows, expected_rows)
+            if not offsets:
+                return
+            if offset == 0 and first_window is not None:
+                results = (fut.result() for fut in first_window)
+            else:
+                results = pool.map(lambda off: site_audit_page_explorer(project_id, issue_id, limit=limit, offset=off), offsets)
+            for code, payload in results:
+                chunk = extract_page_rows(payload) if code == 200 and isinstance(payload, dict) else []
+                chunk = chunk[:max_rows - fetched]
+                if chunk:
+                    fetched += len(chunk)
+                    yield chunk
+                if len(chunk) < limit:
+                    return
+            offset = offsets[-1] + limit
+
+def fetch_pages_for_issue(project_id: str, issue_id: str, max_rows: int = XLSX_MAX_ROWS_PER_SHEET, expected_rows: int = 0):
+    """All page-explorer rows for one issue (see iter_issue_pages)."""
+    return [row for chunk in iter_issue_pages(project_id, issue_id, max_rows, expected_rows) for row in chunk]
+
+ISSUE_PATTERNS = {
+    "H1 Missing": ["missing h1", "h1 missing"],
+    "Multiple H1": ["multiple h1", "more than one h1"],
+    "Duplicate Titles": ["duplicate title"],
+    "Duplicate Meta": ["duplicate meta description", "duplicate description"],
+    "Title Too Long": ["title too long", "meta title too long"],
+    "Title Too Short": ["title too short", "meta title too short"],
+    "Meta Too Long": ["meta description too long", "description too long"],
+    "Meta Too Short": ["meta description too short", "description too short"],
+    "Missing Canonical": ["missing canonical"],
+    "Broken Internal": ["broken internal", "internal link", "broken link"],
+    "Broken External": ["broken external", "external link"],
+    "Redirect Chains": ["redirect chain"],
+    "Orphan Pages": ["orphan page", "orphaned page"],
+    "Missing Alt Text": ["missing alt", "alt text"],
+    "Broken Images": ["broken image"],
+    "Thin Content": ["thin content", "low word count"],
+    "_ROBOTS": ["missing robots.txt", "robots.txt is missing"],
+    "_SITEMAP": ["missing sitemap", "missing xml sitemap", "sitemap.xml is missing"],
+    "_HTTPS": ["mixed content", "http/https", "insecure content"],
+}
+
+def row_get(row: dict, keys: list, default=""):
+    for k in keys:
+        if k in row and row.get(k) not in (None, ""):
+            return row.get(k)
+    return default
+
+def suggest_title_from_url(url: str) -> str:
+    try:
+        path = urlparse(url).path.strip("/")
+        if not path:
+            return ""
+        last = path.split("/")[-1]
+        last = re.sub(r"[-_]+", " ", last).strip()
+        return last.title()[:60]
+    except Exception:
+        return ""
+
+def suggest_h1(title: str, url: str) -> str:
+    t = (title or "").strip()
+    if t and t.lower() != "missing":
+        return t[:70]
+    return suggest_title_from_url(url)[:70]
+
+def suggest_meta(current_meta: str, title: str) -> str:
+    m = (current_meta or "").strip()
+    if m and m.lower() != "missing":
+        return m[:155]
+    return (title or "")[:150]
+
+def suggest_fix_for_broken_link() -> str:
+    return "Update the link to a valid destination (or remove it). If it redirects, link directly to the final URL."
+
+XLSX_ISSUE_SHEETS = [
+    "H1 Missing", "Multiple H1", "Duplicate Titles", "Duplicate Meta",
+    "Title Too Long", "Title Too Short", "Meta Too Long", "Meta Too Short",
+    "Missing Canonical", "Broken Internal", "Broken External", "Redirect Chains",
+    "Orphan Pages", "Missing Alt Text", "Broken Images", "Thin Content"
+]
+
+def iter_formatted_issue_rows(sheet: str, rows):
+    """Task-list rows for one issue sheet, formatted lazily from any iterable of page-explorer rows."""
+    if sheet == "H1 Missing":
+        for r in rows:
+            url = row_get(r, ["url", "page_url", "address"])
+            title = row_get(r, ["title", "meta_title", "page_title"])
+            meta = row_get(r, ["meta_description", "description"])
+            wc = row_get(r, ["word_count", "words", "content_word_count"])
+            pr = "HIGH"
+            yield [url, title, meta, wc, pr, suggest_h1(title, url)]
+
+    elif sheet == "Multiple H1":
+        for r in rows:
+            url = row_get(r, ["url", "page_url", "address"])
+            h1_count = row_get(r, ["h1_count", "headings_h1_count", "count_h1"], default="")
+            h1_tags = row_get(r, ["h1_tags", "h1", "headings_h1"], default="")
+            pr = "HIGH"
+            rec = suggest_h1(row_get(r, ["title", "meta_title", "page_title"]), url)
+            yield [url, h1_count, h1_tags, pr, rec]
+
+    elif sheet == "Duplicate Titles":
+        for r in rows:
+            url = row_get(r, ["url", "page_url"])
+            title = row_get(r, ["title", "meta_title", "page_title"])
+            dup = row_get(r, ["duplicate_count", "duplicates", "count"], default="")
+            pr = "HIGH"
+            sug = (title[:60] if title else suggest_title_from_url(url))
+            yield [url, title, dup, pr, sug]
+
+    elif sheet == "Duplicate Meta":
+        for r in rows:
+            url = row_get(r, ["url", "page_url"])
+            meta = row_get(r, ["meta_description", "description"])
+            dup = row_get(r, ["duplicate_count", "duplicates", "count"], default="")
+            pr = "HIGH"
+            sug = suggest_meta(meta, row_get(r, ["title", "meta_title", "page_title"]))
+            yield [url, meta, dup, pr, sug]
+
+    elif sheet in ("Title Too Long", "Title Too Short"):
+        for r in rows:
+            url = row_get(r, ["url", "page_url"])
+            title = row_get(r, ["title", "meta_title", "page_title"])
+            chars = row_get(r, ["character_count", "chars", "length"], default="")
+            pr = "MEDIUM"
+            sug = (title[:60] if title else suggest_title_from_url(url))
+            yield [url, title, chars, pr, sug]
+
+    elif sheet in ("Meta Too Long", "Meta Too Short"):
+        for r in rows:
+            url = row_get(r, ["url", "page_url"])
+            meta = row_get(r, ["meta_description", "description"])
+            chars = row_get(r, ["character_count", "chars", "length"], default="")
+            pr = "MEDIUM"
+            sug = suggest_meta(meta, row_get(r, ["title", "meta_title", "page_title"]))
+            yield [url, meta, chars, pr, sug]
+
+    elif sheet == "Missing Canonical":
+        for r in rows:
+            url = row_get(r, ["url", "page_url"])
+            status = row_get(r, ["http_status", "status", "status_code"], default="")
+            pr = "HIGH"
+            canonical = url
+            yield [url, status, pr, canonical]
+
+    elif sheet in ("Broken Internal", "Broken External"):
+        for r in rows:
+            source = row_get(r, ["source_url", "url", "page_url"])
+            broken = row_get(r, ["broken_url", "link_url", "target_url"])
+            status = row_get(r, ["http_status", "status", "status_code"], default="")
+            anchor = row_get(r, ["anchor_text", "anchor"], default="")
+            pr = "HIGH" if sheet == "Broken Internal" else "MEDIUM"
+            yield [source, broken, status, anchor, pr, suggest_fix_for_broken_link()]
+
+    elif sheet == "Redirect Chains":
+        for r in rows:
+            initial = row_get(r, ["initial_url", "url"])
+            chain = row_get(r, ["redirect_chain", "chain", "chain_path"], default="")
+            final = row_get(r, ["final_url", "destination_url"], default="")
+            length = row_get(r, ["chain_length", "length"], default="")
+            pr = "MEDIUM"
+            yield [initial, chain, final, length, pr]
+
+    elif sheet == "Orphan Pages":
+        for r in rows:
+            url = row_get(r, ["url", "page_url"])
+            title = row_get(r, ["title", "meta_title", "page_title"])
+            wc = row_get(r, ["word_count", "words"], default="")
+            incoming = row_get(r, ["incoming_links", "inlinks", "internal_inlinks"], default="")
+            pr = "MEDIUM"
+            action = "Add internal links from relevant hub/category pages and ensure it’s included in navigation where appropriate."
+            yield [url, title, wc, incoming, pr, action]
+
+    elif sheet == "Missing Alt Text":
+        for r in rows:
+            page = row_get(r, ["page_url", "url"])
+            img = row_get(r, ["image_url", "asset_url", "url_image"])
+            pr = "LOW"
+            alt = (re.sub(r"[-_]+", " ", (urlparse(img).path.split("/")[-1] if img else "")).split(".")[0]).strip().title()
+            if not alt:
+                alt = suggest_title_from_url(page)[:80]
+            yield [page, img, pr, alt[:80]]
+
+    elif sheet == "Broken Images":
+        for r in rows:
+            page = row_get(r, ["page_url", "url"])
+            img = row_get(r, ["image_url", "broken_image_url", "asset_url"])
+            status = row_get(r, ["http_status", "status", "status_code"], default="")
+            pr = "LOW"
+            fix = "Fix the image URL, restore missing asset, or remove the broken image reference."
+            yield [page, img, status, pr, fix]
+
+    elif sheet == "Thin Content":
+        for r in rows:
+            url = row_get(r, ["url", "page_url"])
+            title = row_get(r, ["title", "meta_title", "page_title"])
+            wc = row_get(r, ["word_count", "words"], default="")
+            pr = "MEDIUM"
+            action = "Expand content to match intent; add missing sections, FAQs, examples, and improve topical depth."
+            yield [url, title, wc, pr, action]
+
+def format_issue_rows(sheet: str, rows: list) -> list:
+    return list(iter_formatted_issue_rows(sheet, rows))
+
+def build_issue_rows_for_xlsx(project_id: str, issues_list: list, max_rows_per_sheet: int = XLSX_MAX_ROWS_PER_SHEET, on_issue=None):
+    """(issue counts, {sheet: lazy row iterator}) for create_excel_from_full_template.
+
+    Each sheet's page-explorer rows are fetched, formatted and written chunk by chunk as the
+    workbook consumes the iterator, so memory does not grow with the number of affected URLs.
+    To keep sheets from waiting on each other, the first window of the next
+    SITE_AUDIT_ISSUE_WORKERS issues is fetched ahead on a shared pool (starting now, while the
+    report is generated), so at most that many windows are held. on_issue(done, total) is called
+    as each fetched sheet runs out.
+    """
+    issue_counts = {}
+
+    issue_ids = {}
+    for sheet, pats in ISSUE_PATTERNS.items():
+        iid, cnt = find_issue_id_and_count(issues_list, pats)
+        issue_ids[sheet] = iid
+        issue_counts[sheet] = cnt
+
+    todo = [sheet for sheet in XLSX_ISSUE_SHEETS if issue_ids.get(sheet) and issue_counts.get(sheet, 0) > 0]
+    done = 0
+    pool = ThreadPoolExecutor(max_workers=SITE_AUDIT_ISSUE_WORKERS) if todo else None
+    first_windows = {}  # sheet -> futures for its first offset window (popped once the sheet starts)
+    submitted = 0
+
+    def prefetch(upto: int):
+        nonlocal submitted
+        while submitted < min(upto, len(todo)):
+            sheet = todo[submitted]
+            limit, offsets = issue_page_window(0, max_rows_per_sheet, issue_counts[sheet])
+            first_windows[sheet] = [
+                pool.submit(site_audit_page_explorer, project_id, issue_ids[sheet], limit=limit, offset=off)
+                for off in offsets
+            ]
+            submitted += 1
+            if submitted == len(todo):
+                pool.shutdown(wait=False)  # queued calls still run; workers exit once they drain
+
+    def sheet_rows(sheet):
+        nonlocal done
+        if sheet not in todo:
+            return
+        prefetch(todo.index(sheet) + 1 + SITE_AUDIT_ISSUE_WORKERS)
+        chunks = iter_issue_pages(project_id, issue_ids[sheet], max_rows_per_sheet, issue_counts[sheet],
+                                  first_window=first_windows.pop(sheet, None))
+        for chunk in chunks:
+            yield from iter_formatted_issue_rows(sheet, chunk)
+        done += 1
+        if on_issue:
+            on_issue(done, len(todo))
+
+    prefetch(SITE_AUDIT_ISSUE_WORKERS)
+    return issue_counts, {sheet: sheet_rows(sheet) for sheet in XLSX_ISSUE_SHEETS}
+
+
+# ===========================
+# 🤖 AI (PROMPT FROM FILE + REAL MODEL ROUTING)
+# Completed outputs are cached on disk, content-addressed by
+# (model id, temperature, prompt): an identical prompt never hits the API twice.
+# ===========================
+GEMINI_MODEL = "gemini-3-flash-preview"
+CLAUDE_MODEL = "claude-3-5-sonnet-20241022"
+CLAUDE_MODEL_OPUS = "claude-3-opus-20240229"
+CLAUDE_MAX_TOKENS = 1800
+CLAUDE_TEMPERATURE = 0.2
+LLM_CACHE_ENABLED = True  # default for run_llm_text(use_cache=None)
+LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+llm_cache = DiskCache(CACHE_DIR / "llm.sqlite", LLM_CACHE_MAX_BYTES)
+_llm_cache_stats = {"hits": 0, "misses": 0, "bypassed": 0}
+_llm_cache_stats_lock = threading.Lock()
+
+def llm_model_id(selected_model_label: str):
+    """(model id, temperature) the label routes to; temperature None = provider default."""
+    if "Gemini" in selected_model_label:
+        return "gemini/" + GEMINI_MODEL, None
+    return "anthropic/" + (CLAUDE_MODEL_OPUS if "Opus" in selected_model_label else CLAUDE_MODEL), CLAUDE_TEMPERATURE
+
+def llm_cache_key(model_id: str, prompt_text: str, temperature=None) -> str:
+    payload = json.dumps([model_id, temperature, prompt_text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def llm_cache_stats() -> dict:
+    with _llm_cache_stats_lock:
+        return dict(_llm_cache_stats)
+
+def _count_llm_cache(outcome: str):
+    with _llm_cache_stats_lock:
+        _llm_cache_stats[outcome] += 1
+
+def stream_llm_text(selected_model_label: str, prompt_text: str):
+    """Yield text chunks from the selected model as they are generated."""
+    if "Gemini" in selected_model_label:
+        model = gemini_model(GEMINI_API_KEY, GEMINI_MODEL)
+        for chunk in model.generate_content(prompt_text, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # chunk without text parts (e.g. safety metadata only)
+            if text:
+                yield text
+        return
+
+    # Claude
+    if not CLAUDE_AVAILABLE:
+        yield "Claude not available (missing key or SDK)."
+        return
+
+    client = claude_client(CLAUDE_API_KEY)
+    claude_model = CLAUDE_MODEL_OPUS if "Opus" in selected_model_label else CLAUDE_MODEL
+
+    with client.messages.stream(
+        model=claude_model,
+        max_tokens=CLAUDE_MAX_TOKENS,
+        temperature=CLAUDE_TEMPERATURE,
+        messages=[{"role": "user", "content": prompt_text}],
+    ) as stream:
+        for text in stream.text_stream:
+            if text:
+                yield text
+
+def run_llm_text(selected_model_label: str, prompt_text: str, on_text=None, use_cache: bool = None,
+                 stats: dict = None) -> str:
+    """Return raw text from the selected model. on_text(text_so_far) is called after every streamed chunk
+    (once with the whole text on a cache hit). stats["llm_cache"] gets "hit", "miss" or "bypassed"."""
+    use_cache = LLM_CACHE_ENABLED if use_cache is None else use_cache
+    model_id, temperature = llm_model_id(selected_model_label)
+    key = llm_cache_key(model_id, prompt_text, temperature)
+    outcome = "miss" if use_cache else "bypassed"
+
+    if use_cache:
+        hit = llm_cache.get(key)
+        if hit:
+            text = hit[1].decode("utf-8")
+            outcome = "hit"
+            _count_llm_cache("hits")
+            if stats is not None:
+                stats["llm_cache"] = outcome
+            if on_text:
+                on_text(text)
+            return text
+
+    parts = []
+    for chunk in stream_llm_text(selected_model_label, prompt_text):
+        parts.append(chunk)
+        if on_text:
+            on_text("".join(parts))
+    text = "".join(parts).strip()
+
+    _count_llm_cache("misses" if use_cache else "bypassed")
+    if stats is not None:
+        stats["llm_cache"] = outcome
+    model_ready = GEMINI_AVAILABLE if model_id.startswith("gemini/") else CLAUDE_AVAILABLE
+    if text and model_ready:
+        # stored even when bypassing, so the fresh answer is what later runs reuse
+        llm_cache.set(key, {"model": model_id, "temperature": temperature, "chars": len(text)}, text.encode("utf-8"))
+    return text
+
+PROMPT_CONTEXT_TOKEN_BUDGET = 12000  # estimated tokens allowed for CONTEXT_JSON
+CHARS_PER_TOKEN = 4  # rough average for JSON-heavy English text
+PROMPT_PAGE_COLUMNS = (
+    "url", "status", "title", "title_len", "meta_len", "h1_count", "word_count", "canonical", "robots_meta",
+    "images_missing_alt", "jsonld_count", "hreflang_count", "redirect_hops", "click_depth", "inlinks", "pagerank",
+)
+PROMPT_TITLE_CHARS = 80
+PROMPT_MIN_PAGE_ROWS = 5
+PROMPT_MIN_EXAMPLES = 3
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _minified(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def _prune_empty(obj):
+    """Copy of obj without None / "" / [] / {} values (0 and False are kept)."""
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            v = _prune_empty(v)
+            if v is not None and v != "" and v != [] and v != {}:
+                out[k] = v
+        return out
+    if isinstance(obj, (list, tuple)):
+        return [_prune_empty(v) for v in obj]
+    return obj
+
+def _page_issue_score(p: dict) -> int:
+    status = p.get("status")
+    return sum((
+        not isinstance(status, int) or status >= 400,
+        not p.get("title_len"),
+        not p.get("meta_len"),
+        p.get("h1_count") != 1,
+        "noindex" in (p.get("robots_meta") or ""),
+        0 < safe_int(p.get("word_count"), 0) < 250,
+        safe_int(p.get("images_missing_alt"), 0) > 0,
+        safe_int(p.get("redirect_hops"), 0) > 0,
+    ))
+
+def columnar_pages(pages: list) -> dict:
+    """pages[] as {"columns": [...], "rows": [[...]]}, pages with the most issues first."""
+    ranked = sorted((p for p in pages if isinstance(p, dict)), key=_page_issue_score, reverse=True)
+    columns = [c for c in PROMPT_PAGE_COLUMNS if any(p.get(c) not in (None, "") for p in ranked)]
+    rows = []
+    for p in ranked:
+        row = [p.get(c) for c in columns]
+        if "title" in columns and isinstance(row[columns.index("title")], str):
+            row[columns.index("title")] = row[columns.index("title")][:PROMPT_TITLE_CHARS]
+        rows.append(row)
+    return {"columns": columns, "rows": rows}
+
+def _longest_list(obj, skip=()):
+    """(length, container, key) of the longest list nested in obj (top-level keys in skip ignored)."""
+    best = (0, None, None)
+    items = obj.items() if isinstance(obj, dict) else enumerate(obj) if isinstance(obj, list) else ()
+    for k, v in items:
+        if k in skip:
+            continue
+        if isinstance(v, list) and len(v) > best[0]:
+            best = (len(v), obj, k)
+        if isinstance(v, (dict, list)):
+            sub = _longest_list(v)
+            if sub[0] > best[0]:
+                best = sub
+    return best
+
+def compact_context(context: dict, token_budget: int = PROMPT_CONTEXT_TOKEN_BUDGET) -> dict:
+    """Shrink an audit context for the prompt: empty values dropped, pages[] columnar with only the
+    fields the prompts use, then truncated (page rows, example lists, any other long list) until the
+    minified JSON fits token_budget. What was cut is listed in context_notes."""
+    ctx = _prune_empty(context)
+    notes = []
+
+    ahrefs = ctx.get("ahrefs")
+    if isinstance(ahrefs, dict):
+        for key in ("top_keywords", "competitors"):
+            if key in ctx and ahrefs.get(key) == ctx[key]:
+                ahrefs.pop(key)  # already at the top level
+
+    total_pages = 0
+    if isinstance(ctx.get("pages"), list):
+        total_pages = len(ctx["pages"])
+        ctx["pages"] = columnar_pages(ctx["pages"])
+
+    def fits():
+        return estimate_tokens(_minified(ctx)) <= token_budget
+
+    rows = ctx["pages"]["rows"] if isinstance(ctx.get("pages"), dict) else []
+    while not fits() and len(rows) > PROMPT_MIN_PAGE_ROWS:
+        del rows[max(PROMPT_MIN_PAGE_ROWS, len(rows) // 2):]
+    if len(rows) < total_pages:
+        notes.append(f"pages: {len(rows)} of {total_pages} analyzed pages shown (most issues first)")
+
+    if not fits() and isinstance(ctx.get("examples"), dict):
+        for key, lst in ctx["examples"].items():
+            if isinstance(lst, list) and len(lst) > PROMPT_MIN_EXAMPLES:
+                notes.append(f"examples.{key}: {PROMPT_MIN_EXAMPLES} of {len(lst)} shown")
+                del lst[PROMPT_MIN_EXAMPLES:]
+
+    while not fits():
+        length, container, key = _longest_list(ctx, skip=("pages",))  # page rows were already cut
+        if length <= 1:
+            break
+        container[key] = container[key][:length // 2]
+        notes.append(f"{key}: list cut to {length // 2} of {length} items")
+
+    if notes:
+        ctx["context_notes"] = notes
+    return ctx
+
+def build_prompt(audit_kind: str, context: dict, token_budget: int = PROMPT_CONTEXT_TOKEN_BUDGET):
+    prompt_path = PROMPT_BASIC if audit_kind == "Basic" else PROMPT_FULL
+    p = load_prompt(prompt_path).strip()
+    if not p:
+        # fallback minimal prompt
+        if audit_kind == "Basic":
+            p = (
+                "You are Claudio, a senior SEO auditor.\n"
+                "Return ONLY Markdown with findings and evidence.\n"
+                "CONTEXT_JSON:\n{{CONTEXT_JSON}}\n"
+            )
+        else:
+            p = (
+                "You are Claudio, an expert SEO auditor.\n"
+                "Return ONLY valid JSON.\n"
+                "CONTEXT_JSON:\n{{CONTEXT_JSON}}\n"
+            )
+    return p.replace("{{CONTEXT_JSON}}", _minified(compact_context(context, token_budget)))
+
+def parse_full_json_or_fallback(raw_text: str) -> dict:
+    raw = strip_json_fences(raw_text)
+    try:
+        return json.loads(raw)
+    except Exception:
+        # fallback if prompt was mis-edited and returns markdown:
+        return {"_raw_text": raw_text}
+
+
+# ===========================
+# 🗂️ TEMPLATE REGISTRY
+# Templates are read once per process and re-read only when the file's
+# mtime/size changes. DOCX: every audit gets a deep copy of the parsed tree.
+# XLSX: only a layout spec is kept (sheet order, column widths, freeze panes,
+# filters and the styled template rows); exports are streamed from it.
+# ===========================
+def _docx_default_template() -> Path:
+    import docx
+
+    return Path(docx.__file__).parent / "templates" / "default.docx"  # what Document() opens
+
+class TemplateRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # (kind, path) -> ((mtime_ns, size), parsed)
+
+    def _parsed(self, kind: str, path: Path, loader):
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        key = (kind, str(path))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] != stamp:
+            entry = (stamp, loader(path))
+            with self._lock:
+                self._entries[key] = entry
+        return entry[1]
+
+    def docx(self, path: Path = None):
+        """(fresh Document, placeholder index) for a .docx template (python-docx's default if path is None)."""
+        path = Path(path) if path else _docx_default_template()
+        doc, index = self._parsed("docx", path, _load_docx_template)
+        with self._lock:  # copies only read the source tree, but python-docx caches lazily on first access
+            return copy.deepcopy(doc), index
+
+    def xlsx_spec(self, path: Path) -> list:
+        """Layout spec of an .xlsx template, one dict per sheet. Shared: treat it as read-only."""
+        return self._parsed("xlsx", Path(path), _load_xlsx_spec)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def _load_docx_template(path: Path):
+    from docx import Document
+
+    doc = Document(str(path))
+    return doc, scan_placeholders(doc)
+
+def _load_xlsx_spec(path: Path) -> list:
+    import openpyxl
+
+    wb = openpyxl.load_workbook(str(path))
+    sheets = []
+    for ws in wb.worksheets:
+        sheets.append({
+            "title": ws.title,
+            "widths": {col: dim.width for col, dim in ws.column_dimensions.items() if dim.customWidth},
+            "freeze_panes": ws.freeze_panes,
+            "auto_filter": ws.auto_filter.ref,
+            "rows": [
+                [(c.value, copy.copy(c.font), copy.copy(c.fill), copy.copy(c.border),
+                  copy.copy(c.alignment), c.number_format) for c in row]
+                for row in ws.iter_rows()
+            ],
+        })
+    wb.close()
+    return sheets
+
+templates = TemplateRegistry()
+
+
+# ===========================
+# 📄 DOCX TEMPLATE FILL (FULL)
+# ===========================
+PLACEHOLDER_RE = re.compile(r"\{\{[^}]+\}\}")
+
+def scan_placeholders(doc: Document) -> list:
+    """One pass over the document body: [(paragraph position, {placeholders})] for every paragraph
+    (body or table cell, nested tables included) that contains a {{...}} placeholder.
+    Positions index list(doc.element.body.iter(w:p)), so they also apply to an identical copy."""
+    from docx.oxml.ns import qn
+
+    index = []
+    for pos, p in enumerate(doc.element.body.iter(qn("w:p"))):
+        text = "".join(t.text or "" for t in p.iter(qn("w:t")))
+        if "{{" in text:
+            found = set(PLACEHOLDER_RE.findall(text))
+            if found:
+                index.append((pos, found))
+    return index
+
+def _replace_in_runs(paragraph, mapping: dict) -> bool:
+    """Substitute placeholders across the paragraph's runs, keeping each run's formatting.
+
+    A replacement lands in the run where its placeholder starts; the rest of a placeholder split
+    over several runs is removed from those runs. Placeholders missing from mapping become "" and,
+    as the old cleanup pass did, the paragraph's text is then trimmed.
+    """
+    runs = paragraph.runs
+    texts = [r.text for r in runs]
+    full = "".join(texts)
+    matches = list(PLACEHOLDER_RE.finditer(full))
+    if not matches:
+        return False
+
+    bounds = []
+    pos = 0
+    for t in texts:
+        bounds.append((pos, pos + len(t)))
+        pos += len(t)
+    out = [[] for _ in runs]
+    owner = 0
+
+    def keep(a: int, b: int):
+        nonlocal owner
+        while a < b:
+            while bounds[owner][1] <= a:
+                owner += 1
+            end = min(b, bounds[owner][1])
+            out[owner].append(full[a:end])
+            a = end
+
+    pos = 0
+    unmapped = False
+    for m in matches:
+        keep(pos, m.start())
+        while bounds[owner][1] <= m.start():
+            owner += 1
+        unmapped = unmapped or m.group(0) not in mapping
+        value = mapping.get(m.group(0), "")
+        out[owner].append("" if value is None else str(value))
+        pos = m.end()
+    keep(pos, len(full))
+
+    new_texts = ["".join(parts) for parts in out]
+    if unmapped:
+        for i in range(len(new_texts)):
+            new_texts[i] = new_texts[i].lstrip()
+            if new_texts[i]:
+                break
+        for i in reversed(range(len(new_texts))):
+            new_texts[i] = new_texts[i].rstrip()
+            if new_texts[i]:
+                break
+    for run, old, new in zip(runs, texts, new_texts):
+        if new != old:
+            run.text = new
+    return True
+
+def fill_placeholders(doc: Document, mapping: dict, index: list = None) -> int:
+    """Fill {{...}} placeholders in place. Only paragraphs listed in index (scan_placeholders) are
+    touched. Returns the number of paragraphs changed."""
+    from docx.oxml.ns import qn
+    from docx.text.paragraph import Paragraph
+
+    index = scan_placeholders(doc) if index is None else index
+    if not index:
+        return 0
+    paragraphs = list(doc.element.body.iter(qn("w:p")))
+    changed = 0
+    for pos, _found in index:
+        changed += _replace_in_runs(Paragraph(paragraphs[pos], None), mapping)
+    return changed
+
+def create_word_from_full_template(mapping: dict) -> BytesIO:
+    doc, index = templates.docx(DOCX_TEMPLATE_FULL)
+    fill_placeholders(doc, mapping, index)
+
+    out = BytesIO()
+    doc.save(out)
+    out.seek(0)
+    return out
+
+# ===========================
+# 📊 XLSX TEMPLATE FILL (FULL)
+# ===========================
+def _template_cell(ws, value, font, fill, border, alignment, number_format):
+    from openpyxl.cell import WriteOnlyCell
+
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font, cell.fill, cell.border, cell.alignment = font, fill, border, alignment
+    cell.number_format = number_format
+    return cell
+
+def create_excel_from_full_template(issue_rows_by_sheet: dict) -> BytesIO:
+    """Write the task list in openpyxl's write-only mode, so memory stays flat however many rows
+    an issue has. Sheets in issue_rows_by_sheet keep only the template's header row followed by
+    their rows (any iterable); every other sheet is reproduced from the template as is."""
+    import openpyxl
+    from openpyxl.utils import get_column_letter, range_boundaries
+
+    wb = openpyxl.Workbook(write_only=True)
+    for sheet in templates.xlsx_spec(XLSX_TEMPLATE_FULL):
+        ws = wb.create_sheet(sheet["title"])
+        for col, width in sheet["widths"].items():
+            ws.column_dimensions[col].width = width
+        ws.freeze_panes = sheet["freeze_panes"]
+
+        rows = issue_rows_by_sheet.get(sheet["title"])
+        template_rows = sheet["rows"][:1] if rows is not None else sheet["rows"]
+        for row in template_rows:
+            ws.append([_template_cell(ws, *c) for c in row])
+        last_row = len(template_rows)
+        for r in rows or ():
+            ws.append(r)
+            last_row += 1
+
+        if sheet["auto_filter"]:
+            min_col, min_row, max_col, _ = range_boundaries(sheet["auto_filter"])
+            ws.auto_filter.ref = f"{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{max(last_row, min_row)}"
+    out = BytesIO()
+    wb.save(out)
+    out.seek(0)
+    return out
+
+
+# ===========================
+# 📄 BASIC DOCX (Markdown to WordprocessingML)
+# The report is parsed once into a flat list of blocks, rendered to a single
+# WordprocessingML fragment and spliced into the document body in one step.
+# ===========================
+MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+MD_LIST_RE = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+MD_HR_RE = re.compile(r"^\s*([-*_])(?:\s*\1){2,}\s*$")
+MD_TABLE_SEP_RE = re.compile(r"^\s*\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?\s*$")
+MD_INLINE_RE = re.compile(
+    r"\*\*\*(.+?)\*\*\*"                                # bold italic
+    r"|\*\*(.+?)\*\*|__(.+?)__"                         # bold
+    r"|(?<![\w*])\*(?![\s*])(.+?)(?<![\s*])\*(?![\w*])"  # italic (not "2 * 3")
+    r"|`([^`]+)`"                                       # code
+    r"|\[([^\]]+)\]\(([^)\s]+)\)"                       # link
+)
+MD_LIST_LEVELS = 3  # deepest list style used ("List Bullet 3" / "List Number 3")
+XML_INVALID_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+DOCX_TABLE_HEADER_FILL = "DBEAFE"
+
+def parse_md_inline(text: str) -> list:
+    """[(text, bold, italic, code)] runs for one line of Markdown. "\\n" in a run is a line break."""
+    runs, pos = [], 0
+    for m in MD_INLINE_RE.finditer(text):
+        if m.start() > pos:
+            runs.append((text[pos:m.start()], False, False, False))
+        both, bold, bold2, italic, code, link_text, link_url = m.groups()
+        if both is not None:
+            runs.append((both, True, True, False))
+        elif bold is not None or bold2 is not None:
+            runs.extend((t, True, i, c) for t, _, i, c in parse_md_inline(bold if bold is not None else bold2))
+        elif italic is not None:
+            runs.extend((t, b, True, c) for t, b, _, c in parse_md_inline(italic))
+        elif code is not None:
+            runs.append((code, False, False, True))
+        else:
+            runs.extend(parse_md_inline(link_text))
+            if link_url.rstrip("/") != link_text.rstrip("/"):
+                runs.append((f" ({link_url})", False, False, False))
+        pos = m.end()
+    if pos < len(text):
+        runs.append((text[pos:], False, False, False))
+    return runs
+
+def _md_table_cells(line: str) -> list:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [parse_md_inline(c.strip().replace("\\|", "|")) for c in re.split(r"(?<!\\)\|", line)]
+
+def parse_markdown(text: str) -> list:
+    """Block list for a Markdown report:
+    ("heading", level, runs) | ("para", runs) | ("item", ordered, depth, list_no, runs)
+    | ("table", header, rows) | ("hr",) | ("code", line)
+
+    list_no changes whenever a new list (or a nested sub-list) starts, so numbering can restart.
+    """
+    lines = (text or "").replace("\r\n", "\n").split("\n")
+    blocks = []
+    lists = []  # open lists, outermost first: [indent, ordered, list_no]
+    list_no = 0
+    in_code = False
+    i = 0
+    while i < len(lines):
+        raw = lines[i]
+        line = raw.strip()
+        i += 1
+        if line.startswith("```"):
+            in_code = not in_code
+            lists.clear()
+            continue
+        if in_code:
+            blocks.append(("code", raw.rstrip()))
+            continue
+        if not line:
+            continue  # blank lines do not end a list: "1. a\n\n2. b" stays one list
+
+        item = MD_LIST_RE.match(raw)
+        if item and not MD_HR_RE.match(raw):
+            indent, ordered = len(item.group(1).expandtabs(4)), item.group(2)[0].isdigit()
+            while lists and lists[-1][0] > indent:
+                lists.pop()
+            if lists and lists[-1][0] == indent and lists[-1][1] != ordered:
+                lists.pop()
+            if not lists or lists[-1][0] < indent:
+                list_no += 1
+                lists.append([indent, ordered, list_no])
+            depth = min(len(lists), MD_LIST_LEVELS) - 1
+            blocks.append(("item", ordered, depth, lists[-1][2], parse_md_inline(item.group(3).strip())))
+            continue
+
+        if lists and raw[:1].isspace() and blocks and blocks[-1][0] == "item":
+            blocks[-1][4].extend([("\n", False, False, False)] + parse_md_inline(line))  # continuation line
+            continue
+        lists.clear()
+
+        heading = MD_HEADING_RE.match(line)
+        if heading:
+            blocks.append(("heading", len(heading.group(1)), parse_md_inline(heading.group(2))))
+        elif MD_HR_RE.match(line):
+            blocks.append(("hr",))
+        elif line.startswith("|") and i < len(lines) and MD_TABLE_SEP_RE.match(lines[i]):
+            header, rows = _md_table_cells(line), []
+            i += 1
+            while i < len(lines) and lines[i].strip().startswith("|"):
+                rows.append(_md_table_cells(lines[i]))
+                i += 1
+            blocks.append(("table", header, rows))
+        elif line.startswith(">"):
+            blocks.append(("para", parse_md_inline(line.lstrip("> ").strip())))
+        else:
+            blocks.append(("para", parse_md_inline(line)))
+    return blocks
+
+def _wml_text(text: str) -> str:
+    return xml_escape(XML_INVALID_RE.sub("", text))
+
+def _wml_runs(runs: list, bold: bool = False) -> str:
+    out = []
+    for text, b, it, code in runs:
+        props = ('<w:rFonts w:ascii="Consolas" w:hAnsi="Consolas"/>' if code else "") \
+            + ("<w:b/>" if b or bold else "") + ("<w:i/>" if it else "")
+        body = "<w:br/>".join(f'<w:t xml:space="preserve">{_wml_text(t)}</w:t>' for t in text.split("\n"))
+        out.append(f"<w:r>{'<w:rPr>' + props + '</w:rPr>' if props else ''}{body}</w:r>")
+    return "".join(out)
+
+def _wml_paragraph(runs: list, style_id: str = None, num_id: int = None, ppr_extra: str = "") -> str:
+    ppr = (f'<w:pStyle w:val="{style_id}"/>' if style_id else "") \
+        + (f'<w:numPr><w:ilvl w:val="0"/><w:numId w:val="{num_id}"/></w:numPr>' if num_id else "") + ppr_extra
+    return f"<w:p>{'<w:pPr>' + ppr + '</w:pPr>' if ppr else ''}{_wml_runs(runs)}</w:p>"
+
+def _wml_table(header: list, rows: list, text_width: int) -> str:
+    ncols = max([len(header)] + [len(r) for r in rows])
+    width = text_width // ncols
+    border = '<w:{0} w:val="single" w:sz="4" w:space="0" w:color="BFBFBF"/>'
+    borders = "".join(border.format(side) for side in ("top", "left", "bottom", "right", "insideH", "insideV"))
+    out = [
+        f'<w:tbl><w:tblPr><w:tblW w:w="{width * ncols}" w:type="dxa"/><w:tblBorders>{borders}</w:tblBorders></w:tblPr>',
+        "<w:tblGrid>" + f'<w:gridCol w:w="{width}"/>' * ncols + "</w:tblGrid>",
+    ]
+    for is_header, cells in [(True, header)] + [(False, r) for r in rows]:
+        cells = cells + [[]] * (ncols - len(cells))
+        shade = f'<w:shd w:val="clear" w:color="auto" w:fill="{DOCX_TABLE_HEADER_FILL}"/>' if is_header else ""
+        out.append("<w:tr>" + ("<w:trPr><w:tblHeader/></w:trPr>" if is_header else ""))
+        for cell in cells[:ncols]:
+            out.append(f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/>{shade}</w:tcPr>'
+                       f"<w:p>{_wml_runs(cell, bold=is_header)}</w:p></w:tc>")
+        out.append("</w:tr>")
+    out.append("</w:tbl>")
+    return "".join(out)
+
+def render_markdown_blocks(doc: Document, blocks: list) -> list:
+    """Body elements (w:p / w:tbl) for parsed Markdown, styled with the document's own styles."""
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+
+    def style_id(name):
+        try:
+            return doc.styles[name].style_id
+        except KeyError:
+            return None
+
+    numbering = None
+    list_nums = {}  # list_no -> numId of a numbering instance restarted at 1
+
+    def restart_num(style_name, list_no):
+        nonlocal numbering
+        if list_no not in list_nums:
+            ppr = doc.styles[style_name].element.pPr
+            if numbering is None:
+                numbering = doc.part.numbering_part.element
+            num = numbering.add_num(numbering.num_having_numId(ppr.numPr.numId.val).abstractNumId.val)
+            num.add_lvlOverride(ilvl=0).add_startOverride(val=1)
+            list_nums[list_no] = num.numId
+        return list_nums[list_no]
+
+    section = doc.sections[-1]
+    text_width = int((section.page_width - section.left_margin - section.right_margin) / 635)  # EMU -> twips
+
+    parts = []
+    for block in blocks:
+        kind = block[0]
+        if kind == "heading":
+            parts.append(_wml_paragraph(block[2], style_id(f"Heading {block[1]}")))
+        elif kind == "item":
+            _, ordered, depth, list_no, runs = block
+            name = ("List Number" if ordered else "List Bullet") + (f" {depth + 1}" if depth else "")
+            num_id = restart_num(name, list_no) if ordered and style_id(name) else None
+            parts.append(_wml_paragraph(runs, style_id(name), num_id))
+        elif kind == "table":
+            parts.append(_wml_table(block[1], block[2], text_width))
+        elif kind == "hr":
+            parts.append(_wml_paragraph([], ppr_extra='<w:pBdr><w:bottom w:val="single" w:sz="6" w:space="1" w:color="auto"/></w:pBdr>'))
+        elif kind == "code":
+            parts.append(_wml_paragraph([(block[1], False, False, True)]))
+        else:
+            parts.append(_wml_paragraph(block[1]))
+    return list(parse_xml(f'<w:body {nsdecls("w")}>{"".join(parts)}</w:body>'))
+
+def create_word_from_content(audit_content, site_name, audit_type):
+    from docx.shared import Pt, RGBColor
+
+    doc, _ = templates.docx()
+    title = doc.add_heading(f'SEO Audit - {site_name}', 0)
+    title.alignment = 1
+
+    subtitle = doc.add_paragraph(f'{audit_type} Audit')
+    subtitle.alignment = 1
+    subtitle_run = subtitle.runs[0]
+    subtitle_run.font.size = Pt(14)
+    subtitle_run.font.color.rgb = RGBColor(96, 165, 250)
+
+    spacer = doc.add_paragraph()
+    body = doc.element.body
+    at = body.index(spacer._p) + 1
+    body[at:at] = render_markdown_blocks(doc, parse_markdown(audit_content))
+
+    doc.add_paragraph()
+    footer = doc.add_paragraph(f'Generated by Claudio - {datetime.now().strftime("%B %d, %Y")}')
+    footer.alignment = 1
+    footer_run = footer.runs[0]
+    footer_run.font.size = Pt(9)
+    footer_run.font.color.rgb = RGBColor(148, 163, 184)
+
+    doc_io = BytesIO()
+    doc.save(doc_io)
+    doc_io.seek(0)
+    return doc_io
+
+
+# ===========================
+# 🚀 AUDIT PIPELINE (headless)
+# One call runs a whole Basic/Full audit; progress is reported through an
+# optional callback(pct, message) instead of UI widgets.
+# ===========================
+MODEL_LABELS = {
+    "gemini": "⚡ Gemini 2.0 Flash",
+    "sonnet": "🎯 Claude Sonnet 4.5",
+    "opus": "👑 Claude Opus 4.5",
+}
+BATCH_JOBS = 4  # domains audited in parallel by run_batch
+
+class AuditError(Exception):
+    """The audit could not be produced; the message is user-facing."""
+
+def available_models():
+    models = []
+    if GEMINI_AVAILABLE:
+        models.append(MODEL_LABELS["gemini"])
+    if CLAUDE_AVAILABLE:
+        models.extend([MODEL_LABELS["sonnet"], MODEL_LABELS["opus"]])
+    return models
+
+def full_ai_out_to_markdown(ai_out: dict) -> str:
+    if isinstance(ai_out, dict) and "_raw_text" in ai_out:
+        return ai_out["_raw_text"]
+    audit_content = ""
+    audit_content += "## EXECUTIVE SUMMARY\n" + (ai_out.get("executive_summary", "") or "") + "\n\n"
+    audit_content += "## CONTENT AUDIT\n" + (ai_out.get("content_audit_summary", "") or "") + "\n\n"
+    audit_content += "## TECHNICAL AUDIT\n" + (ai_out.get("technical_audit_summary", "") or "") + "\n\n"
+    audit_content += "## KEYWORD PERFORMANCE\n" + (ai_out.get("keyword_overview", "") or "") + "\n\n"
+    audit_content += "## BACKLINK PROFILE\n" + (ai_out.get("backlink_observations", "") or "") + "\n\n"
+    audit_content += "## COMPETITIVE ANALYSIS\n" + (ai_out.get("competitive_analysis", "") or "") + "\n\n"
+    audit_content += "## QUICK WINS\n"
+    for i, qw in enumerate((ai_out.get("quick_wins") or [])[:8], start=1):
+        if isinstance(qw, dict):
+            audit_content += f"{i}. {qw.get('action','')} (Impact: {qw.get('impact','')}, Effort: {qw.get('effort','')})\n"
+        else:
+            audit_content += f"{i}. {str(qw)}\n"
+    return audit_content
+
+def build_full_template_mapping(site_name: str, ahrefs_bundle: dict, issue_counts: dict, ai_out: dict,
+                                competitors: list, top_keywords: list) -> dict:
+    # Metrics for placeholders
+    metrics = (ahrefs_bundle or {}).get("metrics", {}) if isinstance(ahrefs_bundle, dict) else {}
+    dr = metrics.get("domain_rating", metrics.get("dr", 0))
+    ar = metrics.get("ahrefs_rank", metrics.get("rank", ""))
+    backlinks_total = metrics.get("backlinks", 0)
+    dofollow_backlinks = metrics.get("dofollow_backlinks", metrics.get("dofollow", ""))
+    refdomains_total = metrics.get("refdomains", metrics.get("referring_domains", 0))
+    dofollow_refdomains = metrics.get("dofollow_refdomains", "")
+
+    organic_keywords = metrics.get("organic_keywords", 0)
+    organic_traffic = metrics.get("organic_traffic", 0)
+
+    # top 2 keywords placeholders
+    kw1 = top_keywords[0] if len(top_keywords) > 0 else {}
+    kw2 = top_keywords[1] if len(top_keywords) > 1 else {}
+
+    # top 2 refdomains placeholders
+    refdomains = (ahrefs_bundle or {}).get("refdomains", []) if isinstance(ahrefs_bundle, dict) else []
+    ref1 = refdomains[0] if len(refdomains) > 0 else {}
+    ref2 = refdomains[1] if len(refdomains) > 1 else {}
+
+    # AI narrative placeholders
+    exec_sum = ai_out.get("executive_summary", "") if isinstance(ai_out, dict) else ""
+    content_sum = ai_out.get("content_audit_summary", "") if isinstance(ai_out, dict) else ""
+    technical_sum = ai_out.get("technical_audit_summary", "") if isinstance(ai_out, dict) else ""
+    keyword_overview = ai_out.get("keyword_overview", "") if isinstance(ai_out, dict) else ""
+    backlink_obs = ai_out.get("backlink_observations", "") if isinstance(ai_out, dict) else ""
+    competitive_analysis = ai_out.get("competitive_analysis", "") if isinstance(ai_out, dict) else ""
+    quick_wins = ai_out.get("quick_wins", []) if isinstance(ai_out, dict) else []
+
+    # Competitors placeholders
+    comps = competitors or []
+
+    # Build mapping
+    mapping = {
+        "{{DOMAIN}}": site_name,
+        "{{AUDIT_DATE}}": datetime.now().strftime("%B %Y"),
+
+        "{{DOMAIN_RATING}}": dr,
+        "{{AHREFS_RANK}}": ar,
+        "{{REFERRING_DOMAINS}}": refdomains_total,
+        "{{ORGANIC_KEYWORDS}}": organic_keywords,
+        "{{ORGANIC_TRAFFIC}}": organic_traffic,
+        "{{TOTAL_BACKLINKS}}": backlinks_total,
+        "{{DOFOLLOW_BACKLINKS}}": dofollow_backlinks,
+        "{{DOFOLLOW_REFDOMAINS}}": dofollow_refdomains,
+
+        "{{EXECUTIVE_SUMMARY}}": exec_sum,
+        "{{CONTENT_AUDIT_SUMMARY}}": content_sum,
+        "{{TECHNICAL_AUDIT_SUMMARY}}": technical_sum,
+        "{{KEYWORD_OVERVIEW}}": keyword_overview,
+        "{{BACKLINK_OBSERVATIONS}}": backlink_obs,
+        "{{COMPETITIVE_ANALYSIS}}": competitive_analysis,
+
+        "{{KW_1}}": kw1.get("keyword", ""),
+        "{{KW_1_POS}}": kw1.get("position", ""),
+        "{{KW_1_VOL}}": kw1.get("volume", ""),
+        "{{KW_1_TRAFFIC}}": kw1.get("traffic", ""),
+        "{{KW_1_VALUE}}": kw1.get("value", ""),
+        "{{KW_1_URL}}": kw1.get("url", ""),
+
+        "{{KW_2}}": kw2.get("keyword", ""),
+        "{{KW_2_POS}}": kw2.get("position", ""),
+        "{{KW_2_VOL}}": kw2.get("volume", ""),
+        "{{KW_2_TRAFFIC}}": kw2.get("traffic", ""),
+        "{{KW_2_VALUE}}": kw2.get("value", ""),
+        "{{KW_2_URL}}": kw2.get("url", ""),
+
+        "{{REF_1_DOMAIN}}": ref1.get("domain", ref1.get("refdomain", "")),
+        "{{REF_1_DR}}": ref1.get("domain_rating", ref1.get("dr", "")),
+        "{{REF_1_LINKS}}": ref1.get("links", ref1.get("backlinks", "")),
+        "{{REF_1_DF}}": ref1.get("dofollow_links", ref1.get("dofollow", "")),
+        "{{REF_1_TRAFFIC}}": ref1.get("traffic", ref1.get("organic_traffic", "")),
+
+        "{{REF_2_DOMAIN}}": ref2.get("domain", ref2.get("refdomain", "")),
+        "{{REF_2_DR}}": ref2.get("domain_rating", ref2.get("dr", "")),
+        "{{REF_2_LINKS}}": ref2.get("links", ref2.get("backlinks", "")),
+        "{{REF_2_DF}}": ref2.get("dofollow_links", ref2.get("dofollow", "")),
+        "{{REF_2_TRAFFIC}}": ref2.get("traffic", ref2.get("organic_traffic", "")),
+
+        "{{MISSING_H1_COUNT}}": issue_counts.get("H1 Missing", 0),
+        "{{MULTIPLE_H1_COUNT}}": issue_counts.get("Multiple H1", 0),
+        "{{DUP_TITLES_COUNT}}": issue_counts.get("Duplicate Titles", 0),
+        "{{DUP_META_COUNT}}": issue_counts.get("Duplicate Meta", 0),
+        "{{TITLE_LONG_COUNT}}": issue_counts.get("Title Too Long", 0),
+        "{{TITLE_SHORT_COUNT}}": issue_counts.get("Title Too Short", 0),
+        "{{META_LONG_COUNT}}": issue_counts.get("Meta Too Long", 0),
+        "{{META_SHORT_COUNT}}": issue_counts.get("Meta Too Short", 0),
+        "{{THIN_CONTENT_COUNT}}": issue_counts.get("Thin Content", 0),
+        "{{MISSING_ALT_COUNT}}": issue_counts.get("Missing Alt Text", 0),
+        "{{BROKEN_IMAGES_COUNT}}": issue_counts.get("Broken Images", 0),
+
+        "{{MISSING_CANONICAL_COUNT}}": issue_counts.get("Missing Canonical", 0),
+        "{{BROKEN_INTERNAL_COUNT}}": issue_counts.get("Broken Internal", 0),
+        "{{BROKEN_EXTERNAL_COUNT}}": issue_counts.get("Broken External", 0),
+        "{{REDIRECT_CHAINS_COUNT}}": issue_counts.get("Redirect Chains", 0),
+        "{{ORPHAN_PAGES_COUNT}}": issue_counts.get("Orphan Pages", 0),
+
+        "{{MISSING_CANONICAL_PRIORITY}}": priority_from_count(issue_counts.get("Missing Canonical", 0)),
+        "{{BROKEN_INTERNAL_PRIORITY}}": priority_from_count(issue_counts.get("Broken Internal", 0)),
+        "{{BROKEN_EXTERNAL_PRIORITY}}": priority_from_count(issue_counts.get("Broken External", 0)),
+        "{{REDIRECT_CHAINS_PRIORITY}}": priority_from_count(issue_counts.get("Redirect Chains", 0)),
+        "{{ORPHAN_PAGES_PRIORITY}}": priority_from_count(issue_counts.get("Orphan Pages", 0)),
+        "{{TITLE_LONG_PRIORITY}}": priority_from_count(issue_counts.get("Title Too Long", 0)),
+        "{{TITLE_SHORT_PRIORITY}}": priority_from_count(issue_counts.get("Title Too Short", 0)),
+        "{{META_LONG_PRIORITY}}": priority_from_count(issue_counts.get("Meta Too Long", 0)),
+        "{{META_SHORT_PRIORITY}}": priority_from_count(issue_counts.get("Meta Too Short", 0)),
+        "{{THIN_CONTENT_PRIORITY}}": priority_from_count(issue_counts.get("Thin Content", 0)),
+        "{{MISSING_ALT_PRIORITY}}": priority_from_count(issue_counts.get("Missing Alt Text", 0)),
+        "{{BROKEN_IMAGES_PRIORITY}}": priority_from_count(issue_counts.get("Broken Images", 0)),
+
+        "{{CONTENT_ISSUES_COUNT}}": sum([
+            issue_counts.get("H1 Missing", 0),
+            issue_counts.get("Multiple H1", 0),
+            issue_counts.get("Duplicate Titles", 0),
+            issue_counts.get("Duplicate Meta", 0),
+            issue_counts.get("Title Too Long", 0),
+            issue_counts.get("Title Too Short", 0),
+            issue_counts.get("Meta Too Long", 0),
+            issue_counts.get("Meta Too Short", 0),
+            issue_counts.get("Thin Content", 0),
+            issue_counts.get("Missing Alt Text", 0),
+            issue_counts.get("Broken Images", 0),
+        ]),
+        "{{TECHNICAL_ISSUES_COUNT}}": sum([
+            issue_counts.get("Missing Canonical", 0),
+            issue_counts.get("Broken Internal", 0),
+            issue_counts.get("Broken External", 0),
+            issue_counts.get("Redirect Chains", 0),
+            issue_counts.get("Orphan Pages", 0),
+            issue_counts.get("_ROBOTS", 0),
+            issue_counts.get("_SITEMAP", 0),
+            issue_counts.get("_HTTPS", 0),
+        ]),
+        "{{CONTENT_PRIORITY}}": "HIGH" if sum(issue_counts.get(k, 0) for k in ["H1 Missing","Duplicate Titles","Duplicate Meta"]) > 0 else "MEDIUM",
+        "{{TECHNICAL_PRIORITY}}": "HIGH" if sum(issue_counts.get(k, 0) for k in ["Missing Canonical","Broken Internal"]) > 0 else "MEDIUM",
+
+        "{{BACKLINK_OPP_COUNT}}": refdomains_total,
+        "{{COMPETITIVE_GAPS_COUNT}}": len(comps),
+
+        "{{YOUR_DR}}": dr,
+        "{{YOUR_REFDOM}}": refdomains_total,
+        "{{YOUR_KW}}": organic_keywords,
+        "{{YOUR_TRAFFIC}}": organic_traffic,
+        "{{YOUR_VALUE}}": "",
+    }
+
+    # Quick wins placeholders
+    if not isinstance(quick_wins, list):
+        quick_wins = []
+    while len(quick_wins) < 5:
+        quick_wins.append({"action": "", "impact": "Medium", "effort": "Low"})
+    for i in range(5):
+        qw = quick_wins[i] if isinstance(quick_wins[i], dict) else {"action": str(quick_wins[i])}
+        mapping[f"{{{{QUICK_WIN_{i+1}}}}}"] = qw.get("action", "")
+        mapping[f"{{{{QW{i+1}_IMPACT}}}}"] = qw.get("impact", "Medium")
+        mapping[f"{{{{QW{i+1}_EFFORT}}}}"] = qw.get("effort", "Low")
+
+    # Competitor placeholders COMP_1..5
+    for i in range(5):
+        c = comps[i] if i < len(comps) else {}
+        mapping[f"{{{{COMP_{i+1}}}}}"] = c.get("domain", c.get("target", ""))
+        mapping[f"{{{{COMP_{i+1}_DR}}}}"] = c.get("domain_rating", c.get("dr", ""))
+        mapping[f"{{{{COMP_{i+1}_REFDOM}}}}"] = c.get("refdomains", c.get("referring_domains", ""))
+        mapping[f"{{{{COMP_{i+1}_KW}}}}"] = c.get("organic_keywords", c.get("keywords", ""))
+        mapping[f"{{{{COMP_{i+1}_TRAFFIC}}}}"] = c.get("organic_traffic", c.get("traffic", ""))
+        mapping[f"{{{{COMP_{i+1}_VALUE}}}}"] = c.get("traffic_value", c.get("value", ""))
+
+    return mapping
+
+def run_audit(url_input: str, audit_type: str = "Basic", model_label: str = None, progress=None, on_text=None,
+              use_llm_cache: bool = None) -> dict:
+    """Run a Basic or Full audit end to end and return content, context and the generated files.
+
+    on_text(text_so_far) receives the model output while it streams (Markdown for Basic, JSON for Full).
+    use_llm_cache=False forces a fresh generation (default: LLM_CACHE_ENABLED).
+    """
+    progress = progress or no_progress
+    url_input = (url_input or "").strip()
+    if not url_input:
+        raise AuditError("Please enter a URL")
+
+    type_audit = "Full" if "full" in (audit_type or "").lower() else "Basic"
+    model_label = model_label or next(iter(available_models()), None)
+    if not model_label:
+        raise AuditError("No AI models configured.")
+    if type_audit == "Full" and not (AHREFS_AVAILABLE or AHREFS_OFFLINE):
+        raise AuditError("Ahrefs API not configured. Cannot perform Full audit.")
+
+    domain = normalize_domain(url_input)
+    site_name = domain or url_input.replace('https://', '').replace('http://', '').replace('www.', '').split('/')[0]
+
+    # Step 1: Analyze site
+    progress(20, "🔍 Analyzing website...")
+
+    basic_context = None
+
+    if type_audit == "Basic":
+        try:
+            basic_context = basic_real_audit(url_input, progress=progress)
+            progress(65, "🔍 Taking homepage snapshot...")
+            site_data = analyze_basic_site(url_input)
+        except Exception as e:
+            raise AuditError(f"Basic audit crawl failed: {str(e)}") from e
+    else:
+        site_data = analyze_basic_site(url_input)
+
+    if isinstance(site_data, dict) and 'error' in site_data:
+        raise AuditError(f"Error: {site_data['error']}")
+
+    # Step 2: Full = Ahrefs Explorer + best-effort Site Audit
+    ahrefs_bundle = {}
+    issue_counts = {}
+    issue_rows_by_sheet = {}
+    competitors = []
+    top_keywords = []
+
+    if type_audit == "Full":
+        progress(45, "📊 Fetching Ahrefs Explorer data...")
+
+        ahrefs_bundle = get_site_explorer_bundle(domain, country="us")
+        competitors = ahrefs_bundle.get("competitors", []) if isinstance(ahrefs_bundle, dict) else []
+        top_keywords = ahrefs_bundle.get("top_keywords", []) if isinstance(ahrefs_bundle, dict) else []
+
+        # Try Site Audit (may be restricted)
+        progress(55, "📌 Attempting Ahrefs Site Audit project (best-effort)...")
+
+        project_id = None
+        code, projects_payload = site_audit_projects()
+        if code == 200 and projects_payload:
+            project_id, _proj = pick_project_for_domain(projects_payload, domain)
+
+        if project_id:
+            code, issues_payload = site_audit_issues(project_id)
+            if code == 200 and issues_payload:
+                issues_list = extract_issue_list(issues_payload)
+                issue_counts, issue_rows_by_sheet = build_issue_rows_for_xlsx(
+                    project_id=project_id,
+                    issues_list=issues_list,
+                    max_rows_per_sheet=XLSX_MAX_ROWS_PER_SHEET,
+                    on_issue=lambda done, total: progress(85 + 10 * done // total, f"📌 Exported Site Audit issue {done}/{total}"),
+                )
+        # If Site Audit is not accessible, we keep issue counts empty and still generate Word from template.
+
+    # Step 3: Generate audit content from external prompt
+    progress(70, "🤖 Generating audit content...")
+
+    ai_out = None
+    llm_stats = {}
+    if type_audit == "Basic":
+        # Real crawl context + homepage snapshot
+        context = basic_context.copy() if isinstance(basic_context, dict) else {}
+        context["basic_onpage"] = site_data
+        prompt_text = build_prompt("Basic", context)
+        progress(72, f"🤖 Prompt ready (~{estimate_tokens(prompt_text):,} tokens), generating...")
+        raw_text = run_llm_text(model_label, prompt_text, on_text=on_text, use_cache=use_llm_cache, stats=llm_stats)
+        audit_content = raw_text  # expected Markdown findings document
+    else:
+        # Full prompt expected JSON (for placeholders)
+        context = {
+            "domain": domain,
+            "audit_date": datetime.now().strftime("%B %Y"),
+            "basic_onpage": site_data,
+            "ahrefs": ahrefs_bundle or {},
+            "site_audit_issue_counts": issue_counts or {},
+            "competitors": competitors or [],
+            "top_keywords": top_keywords or [],
+        }
+        prompt_text = build_prompt("Full", context)
+        progress(72, f"🤖 Prompt ready (~{estimate_tokens(prompt_text):,} tokens), generating...")
+        raw_text = run_llm_text(model_label, prompt_text, on_text=on_text, use_cache=use_llm_cache, stats=llm_stats)
+        ai_out = parse_full_json_or_fallback(raw_text)
+        audit_content = full_ai_out_to_markdown(ai_out)
+
+    # Step 4: Create documents
+    progress(85, "📄 Creating documents...")
+
+    if type_audit == "Full":
+        if not DOCX_TEMPLATE_FULL.exists():
+            raise AuditError("Missing Word template: templates/SEO_Audit_Template_Full.docx")
+        if not XLSX_TEMPLATE_FULL.exists():
+            raise AuditError("Missing Excel template: templates/SEO_Tasks_Template_Full.xlsx")
+
+        mapping = build_full_template_mapping(site_name, ahrefs_bundle, issue_counts, ai_out, competitors, top_keywords)
+        doc_file = create_word_from_full_template(mapping)
+
+        # Excel: if Site Audit not accessible, issue_rows_by_sheet is empty -> template will still download (with headers).
+        # Issue rows are fetched from Ahrefs while the sheets are written.
+        excel_file = create_excel_from_full_template(issue_rows_by_sheet)
+    else:
+        doc_file = create_word_from_content(audit_content, site_name, type_audit)
+        excel_file = None
+
+    return {
+        "domain": domain,
+        "site_name": site_name,
+        "audit_type": type_audit,
+        "model": model_label,
+        "audit_content": audit_content,
+        "ai_out": ai_out,
+        "context": context,
+        "prompt_tokens": estimate_tokens(prompt_text),
+        "llm_cache": llm_stats.get("llm_cache"),
+        "issue_counts": issue_counts,
+        "doc_file": doc_file,
+        "excel_file": excel_file,
+    }
+
+def output_basename(site_name: str, kind: str = "Audit") -> str:
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", site_name or "site").strip("_") or "site"
+    return f"SEO_{kind}_{safe}_{datetime.now().strftime('%Y%m%d')}"
+
+def write_audit_outputs(result: dict, out_dir) -> list:
+    """Write DOCX (+ XLSX for Full) and a JSON dump of content/context. Returns the written paths."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+
+    docx_path = out_dir / (output_basename(result["site_name"]) + ".docx")
+    docx_path.write_bytes(result["doc_file"].getvalue())
+    written.append(docx_path)
+
+    if result.get("excel_file") is not None:
+        xlsx_path = out_dir / (output_basename(result["site_name"], "Tasks") + ".xlsx")
+        xlsx_path.write_bytes(result["excel_file"].getvalue())
+        written.append(xlsx_path)
+
+    json_path = out_dir / (output_basename(result["site_name"]) + ".json")
+    payload = {k: result.get(k) for k in ("domain", "audit_type", "model", "prompt_tokens", "audit_content", "ai_out", "issue_counts", "context")}
+    json_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    written.append(json_path)
+    return written
+
+def run_batch(domains: list, audit_type: str = "Basic", model_label: str = None, out_dir="audits",
+              jobs: int = BATCH_JOBS, progress=None, use_llm_cache: bool = None) -> list:
+    """Audit many domains with `jobs` running at once. progress(domain, pct, message) is optional.
+
+    Returns one summary dict per domain (input order): {"domain", "ok", "files", "error"}.
+    """
+    def _one(domain):
+        def _progress(pct, message):
+            if progress:
+                progress(domain, pct, message)
+        try:
+            result = run_audit(domain, audit_type, model_label, progress=_progress, use_llm_cache=use_llm_cache)
+            files = write_audit_outputs(result, out_dir)
+            _progress(100, "✅ Complete!")
+            return {"domain": domain, "ok": True, "files": [str(f) for f in files], "error": ""}
+        except Exception as e:
+            _progress(100, f"❌ {e}")
+            return {"domain": domain, "ok": False, "files": [], "error": str(e)}
+
+    domains = [d.strip() for d in domains if d and d.strip()]
+    if not domains:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(domains)))) as pool:
+        return list(pool.map(_one, domains))
+
@@ -0,0 +1,190 @@
+"""Background audit jobs: a persistent SQLite queue drained by a local worker pool.
+
+Audits run off the Streamlit script thread, so widget interactions, reruns and
+browser refreshes no longer kill a run in flight. Every progress callback from
+the engine is stored as an event the UI can poll.
+"""
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+import audit_engine as engine
+
+JOBS_DIR = engine.BASE_DIR / ".jobs"
+JOB_WORKERS = 2  # audits running at once in this process
+JOB_POLL_SECONDS = 0.5  # idle worker wake-up interval
+JOB_PARTIAL_INTERVAL = 0.5  # min seconds between writes of streamed model output
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class JobQueue:
+    def __init__(self, jobs_dir: Path = JOBS_DIR, workers: int = JOB_WORKERS):
+        self.jobs_dir = Path(jobs_dir)
+        self.db_path = self.jobs_dir / "jobs.sqlite"
+        self.workers = max(1, workers)
+        self._claim_lock = threading.Lock()
+        self._threads = []
+        self._stop = threading.Event()
+        self._init_db()
+
+    # ---------- storage ----------
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, audit_type TEXT, model TEXT, "
+                "status TEXT, pct INTEGER DEFAULT 0, message TEXT DEFAULT '', error TEXT DEFAULT '', "
+                "result TEXT, created_at REAL, started_at REAL, finished_at REAL, partial TEXT DEFAULT '', "
+                "llm_cache INTEGER DEFAULT 1)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, job_id INTEGER, ts REAL, pct INTEGER, message TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS events_job ON events(job_id, id)")
+            # job databases created by older versions
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, ddl in (("partial", "TEXT DEFAULT ''"), ("llm_cache", "INTEGER DEFAULT 1")):
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {ddl}")
+            conn.commit()
+
+    def submit(self, url: str, audit_type: str, model_label: str, use_llm_cache: bool = True) -> int:
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (url, audit_type, model, status, message, created_at, llm_cache) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, audit_type, model_label, JOB_QUEUED, "⏳ Queued", time.time(), int(bool(use_llm_cache))),
+            )
+            conn.commit()
+            return cur.lastrowid
+
+    def get(self, job_id: int):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            if job["status"] == JOB_QUEUED:
+                job["ahead"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND id < ?", (JOB_QUEUED, job_id)
+                ).fetchone()[0]
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        return job
+
+    def events(self, job_id: int, after_id: int = 0, limit: int = 200) -> list:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, ts, pct, message FROM events WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (job_id, after_id, limit),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def latest_events(self, job_id: int, limit: int = 8) -> list:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, ts, pct, message FROM events WHERE job_id = ? ORDER BY id DESC LIMIT ?", (job_id, limit)
+            ).fetchall()
+        return [dict(r) for r in reversed(rows)]
+
+    def _record(self, job_id: int, pct: int, message: str):
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT INTO events (job_id, ts, pct, message) VALUES (?, ?, ?, ?)", (job_id, time.time(), pct, message))
+            conn.execute("UPDATE jobs SET pct = ?, message = ? WHERE id = ?", (pct, message, job_id))
+            conn.commit()
+
+    def _set_partial(self, job_id: int, text: str):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET partial = ? WHERE id = ?", (text, job_id))
+            conn.commit()
+
+    def _finish(self, job_id: int, status: str, result: dict = None, error: str = ""):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time(), job_id),
+            )
+            conn.commit()
+
+    def _claim(self):
+        with self._claim_lock, closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (JOB_QUEUED,)).fetchone()
+            if row is None:
+                return None
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                (JOB_RUNNING, time.time(), row["id"], JOB_QUEUED),
+            )
+            conn.commit()
+            return dict(row) if cur.rowcount == 1 else None
+
+    # ---------- workers ----------
+    def start(self):
+        """Start the worker pool. Jobs left 'running' by a previous process are queued again."""
+        if self._threads:
+            return self
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET status = ?, message = ? WHERE status = ?", (JOB_QUEUED, "⏳ Re-queued after restart", JOB_RUNNING))
+            conn.commit()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"audit-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                time.sleep(JOB_POLL_SECONDS)
+                continue
+            self._run(job)
+
+    def _run(self, job: dict):
+        job_id = job["id"]
+
+        last_partial = [0.0]
+
+        def on_progress(pct, message):
+            self._record(job_id, pct, message)
+
+        def on_text(text):
+            now = time.monotonic()
+            if now - last_partial[0] >= JOB_PARTIAL_INTERVAL:
+                last_partial[0] = now
+                self._set_partial(job_id, text)
+
+        try:
+            result = engine.run_audit(
+                job["url"], job["audit_type"], job["model"], progress=on_progress, on_text=on_text,
+                use_llm_cache=bool(job["llm_cache"]),
+            )
+            files = engine.write_audit_outputs(result, self.jobs_dir / str(job_id))
+            self._record(job_id, 100, "✅ Complete!")
+            self._finish(job_id, JOB_DONE, {
+                "site_name": result["site_name"],
+                "audit_type": result["audit_type"],
+                "audit_content": result["audit_content"],
+                "llm_cache": result.get("llm_cache"),
+                "files": {Path(f).suffix.lstrip("."): str(f) for f in files},
+            })
+        except Exception as e:
+            message = str(e) if isinstance(e, engine.AuditError) else f"Audit failed: {e}"
+            self._record(job_id, 100, f"❌ {message}")
+            self._finish(job_id, JOB_FAILED, error=message)
@@ -0,0 +1,71 @@
+"""Import-time regression benchmark for the app's cold start.
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --runs 9 --max-ms 300
+
+Every run imports what app.py loads before its first paint (audit_engine and
+audit_jobs) in a fresh interpreter under `python -X importtime`. It prints the
+median wall time and the slowest imports. The exit code is 1 if a lazily
+loaded library was imported eagerly, or if the median is above --max-ms.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ("audit_engine", "audit_jobs")
+LAZY_MODULES = ("google.generativeai", "anthropic", "docx", "openpyxl", "lxml.etree", "numpy")  # must stay off the import path
+TOP_IMPORTS = 12
+
+
+def import_once() -> tuple:
+    """(wall seconds, {module: cumulative µs}) for one cold import in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); " + "; ".join(f"import {m}" for m in MODULES) + \
+        "; print(time.perf_counter() - t)"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if cum.isdigit():
+            cumulative[name] = int(cum)
+    return float(proc.stdout.strip().splitlines()[-1]), cumulative
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the cold import time of the audit engine.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time (default: 5)")
+    parser.add_argument("--max-ms", type=float, default=0, help="Fail when the median exceeds this many ms")
+    args = parser.parse_args(argv)
+
+    walls, last = [], {}
+    for _ in range(max(1, args.runs)):
+        wall, last = import_once()
+        walls.append(wall)
+    median_ms = statistics.median(walls) * 1000
+
+    print(f"import {', '.join(MODULES)}: median {median_ms:.0f} ms over {len(walls)} run(s) "
+          f"(min {min(walls) * 1000:.0f} ms, max {max(walls) * 1000:.0f} ms)")
+    print("slowest imports (cumulative, last run):")
+    for name, us in sorted(last.items(), key=lambda kv: kv[1], reverse=True)[:TOP_IMPORTS]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = [m for m in LAZY_MODULES if m in last]
+    if eager:
+        failed = True
+        print("FAIL  imported eagerly: " + ", ".join(eager))
+    if args.max_ms and median_ms > args.max_ms:
+        failed = True
+        print(f"FAIL  median {median_ms:.0f} ms is above --max-ms {args.max_ms:.0f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Headless batch runner for Claudio audits.
+
+    python cli.py example.com other.com --type full --model sonnet --jobs 4 --out audits/
+    python cli.py --domains-file clients.txt --type basic
+
+API keys are read from the environment: GOOGLE_API_KEY, ANTHROPIC_API_KEY,
+AHREFS_API_KEY (and AHREFS_OFFLINE=1 for cached-only Ahrefs replay).
+"""
+import argparse
+import sys
+import threading
+
+import audit_engine as engine
+
+
+def read_domains(args) -> list:
+    domains = list(args.domains or [])
+    if args.domains_file:
+        with open(args.domains_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    domains.append(line)
+    return list(dict.fromkeys(domains))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run Claudio SEO audits without the Streamlit UI.")
+    parser.add_argument("domains", nargs="*", help="Domains or URLs to audit")
+    parser.add_argument("--domains-file", help="Text file with one domain per line (# comments allowed)")
+    parser.add_argument("--type", choices=["basic", "full"], default="basic", help="Audit type (default: basic)")
+    parser.add_argument("--model", choices=sorted(engine.MODEL_LABELS), default="gemini", help="LLM to use (default: gemini)")
+    parser.add_argument("--jobs", type=int, default=engine.BATCH_JOBS, help=f"Domains audited in parallel (default: {engine.BATCH_JOBS})")
+    parser.add_argument("--out", default="audits", help="Output directory for DOCX/XLSX/JSON files (default: audits)")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Always call the model, even for a prompt answered before")
+    parser.add_argument("--quiet", action="store_true", help="Only print the final summary")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    domains = read_domains(args)
+    if not domains:
+        parser.error("no domains given (pass them as arguments or with --domains-file)")
+
+    engine.configure_from_env()
+    model_label = engine.MODEL_LABELS[args.model]
+    if model_label not in engine.available_models():
+        print(f"Model '{args.model}' is not configured (missing API key or SDK).", file=sys.stderr)
+        return 2
+    if args.type == "full" and not (engine.AHREFS_AVAILABLE or engine.AHREFS_OFFLINE):
+        print("Full audits need AHREFS_API_KEY (or AHREFS_OFFLINE=1 for cached replay).", file=sys.stderr)
+        return 2
+
+    print_lock = threading.Lock()
+
+    def on_progress(domain, pct, message):
+        if args.quiet:
+            return
+        with print_lock:
+            print(f"[{domain}] {pct:3d}% {message}", file=sys.stderr, flush=True)
+
+    results = engine.run_batch(
+        domains,
+        audit_type=args.type,
+        model_label=model_label,
+        out_dir=args.out,
+        jobs=args.jobs,
+        progress=on_progress,
+        use_llm_cache=not args.no_llm_cache,
+    )
+
+    failed = 0
+    for res in results:
+        if res["ok"]:
+            print(f"OK    {res['domain']}: " + ", ".join(res["files"]))
+        else:
+            failed += 1
+            print(f"FAIL  {res['domain']}: {res['error']}")
+    print(f"{len(results) - failed}/{len(results)} audits completed")
+    stats = engine.llm_cache_stats()
+    print(f"LLM cache: {stats['hits']} hit(s), {stats['misses']} miss(es), {stats['bypassed']} bypassed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())